@@ -2,9 +2,12 @@
 # data parent paths
 DATASETS_PATH = "data/datasets/"
 SCHEMAS_PATH = "data/schemas/" # holds prepared schemas once generated
+INTROSPECTED_SCHEMAS_PATH = "data/schemas_introspected/" # holds schemas introspected from scaled variants
 CANDIDATE_PATH = "data/candidates/"
 METADATA_PATH = "data/metadata/"
 RESULTS_PATH = "data/results/" # holds responses of specified llm
+EMBEDDINGS_PATH = "data/embeddings/" # holds extracted word vectors
+VOCAB_PATH = "data/vocab/" # holds cached noun vocabularies
 
 
 # spider paths
@@ -1,9 +1,50 @@
 import os
 import json
 import argparse
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor
 
 from configs.paths import SCHEMAS_PATH, SPIDER_DEV_PATH
 from models.schema_scaler import SchemaScaler, ScaleConfig
+from models.schema_populator import PopulateConfig
+from models.schema_catalog import load_schema
+
+
+# scale a single database (schema json, sqlite file and metadata)
+def scale_database(db: str, cfg: ScaleConfig, pop_cfg: PopulateConfig = None) -> str:
+    schema_json = load_schema(f"{SCHEMAS_PATH}spider", db)
+
+    sc = SchemaScaler(schema_json = schema_json, cfg=cfg)
+
+    new_schema = sc.enlarge()
+
+    sc.create_new_sqlite_db()
+
+    if pop_cfg:
+        sc.populate_sqlite_db(pop_cfg)
+
+    sc.monitor_metadata()
+
+    return db
+
+# scale a single database to all sizes, each variant extends the previous one
+def sweep_database(db: str, cfg: ScaleConfig, sizes: list, pop_cfg: PopulateConfig = None) -> str:
+    schema_json = load_schema(f"{SCHEMAS_PATH}spider", db)
+
+    sizes = sorted(sizes)
+    sc = SchemaScaler(schema_json = schema_json, cfg=replace(cfg, target_total_tables=sizes[0]))
+
+    for size in sizes:
+        new_schema = sc.extend_to(size)
+
+        sc.create_new_sqlite_db()
+
+        if pop_cfg:
+            sc.populate_sqlite_db(pop_cfg)
+
+        sc.monitor_metadata()
+
+    return db
 
 
 if __name__ == '__main__':
@@ -11,27 +52,57 @@ if __name__ == '__main__':
 
     parser.add_argument("--target_size", type=int, default=100)
     parser.add_argument("--apply_level_2", action="store_false")
+    parser.add_argument("--lazy_join_pairs", action="store_true") # sample join pairs lazily (large targets)
+    parser.add_argument("--derive_seeds", action="store_true") # per-database seed from seed + db_id
+    parser.add_argument("--in_memory_build", action="store_true") # build sqlite files in memory, write once
+    parser.add_argument("--overlay", action="store_true") # store only synthetic tables, attach original on open
+    parser.add_argument("--schema_catalog", action="store_true") # one schema catalog per variant instead of json files
+    parser.add_argument("--schema_delta", action="store_true") # store only synthetic tables, resolved against the original
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sweep", type=int, nargs="+", default=None) # nested sizes, e.g. 50 100 200 500 1000
+    parser.add_argument("--populate", action="store_true") # fill synthetic tables with rows
+    parser.add_argument("--rows_entity", type=int, default=1000)
+    parser.add_argument("--rows_join", type=int, default=2000)
+    parser.add_argument("--rows_meta", type=int, default=5000)
+    parser.add_argument("--index_fks", action="store_true") # index foreign key columns of populated tables
     args = parser.parse_args()
 
     cfg = ScaleConfig(
         target_total_tables=args.target_size, 
         apply_family_generation=args.apply_level_2,
-        apply_join_competition=args.apply_level_2
+        apply_join_competition=args.apply_level_2,
+        lazy_join_pairs=args.lazy_join_pairs,
+        derive_db_seed=args.derive_seeds,
+        sqlite_in_memory=args.in_memory_build,
+        sqlite_overlay=args.overlay,
+        schema_catalog=args.schema_catalog,
+        schema_delta=args.schema_delta
     )
 
+    pop_cfg = None
+    if args.populate:
+        pop_cfg = PopulateConfig(
+            rows_entity=args.rows_entity,
+            rows_join=args.rows_join,
+            rows_meta=args.rows_meta,
+            create_indexes=args.index_fks,
+            seed=cfg.seed
+        )
+
     with open(SPIDER_DEV_PATH, "r") as f:
         samples = json.load(f)
 
-    databases = set([sample["db_id"] for sample in samples])
-
-    for db in databases:
-        with open(f"{SCHEMAS_PATH}spider/{db}.json", "r") as f:
-            schema_json = json.load(f)
-
-        sc = SchemaScaler(schema_json = schema_json, cfg=cfg)
+    databases = sorted(set([sample["db_id"] for sample in samples]))
 
-        new_schema = sc.enlarge()
-
-        sc.create_new_sqlite_db()
+    if args.sweep:
+        job, job_args = sweep_database, [[cfg] * len(databases), [args.sweep] * len(databases), [pop_cfg] * len(databases)]
+    else:
+        job, job_args = scale_database, [[cfg] * len(databases), [pop_cfg] * len(databases)]
 
-        sc.monitor_metadata()
\ No newline at end of file
+    if args.workers > 1:
+        # every scaler owns its rng, so results do not depend on scheduling
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(job, databases, *job_args))
+    else:
+        for db_args in zip(databases, *job_args):
+            job(*db_args)
\ No newline at end of file
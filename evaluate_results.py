@@ -1,6 +1,7 @@
 import argparse
 
 from models.evaluator import Evaluator
+from models.schema_renderer import SCHEMA_FORMATS
 
 DATASET = "spider"
 
@@ -11,6 +12,8 @@ if __name__ == '__main__':
     parser.add_argument("--db_size", type=str, default="100")
     parser.add_argument("--apply_level_2", action="store_false")
     parser.add_argument("--schema_filter", type=str, choices=["bm25", "dense"], default=None)
+    parser.add_argument("--schema_format", type=str, choices=SCHEMA_FORMATS, default="default")
+    parser.add_argument("--fk_expand", action="store_true")
     args = parser.parse_args()
 
     MODEL = args.model
@@ -23,7 +26,9 @@ if __name__ == '__main__':
         db_size=DB_SIZE, 
         model=MODEL,
         f_suffix=F_SUFFIX, 
-        schema_filter=SCHEMA_FILTER
+        schema_filter=SCHEMA_FILTER,
+        schema_format=args.schema_format,
+        fk_expand=args.fk_expand
     )
 
     # calculate scores
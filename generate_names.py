@@ -1,14 +1,62 @@
+import sys
 import json
-import fasttext
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-from models.name_casting import NameCasting
-from utils.vocab import load_noun_vocabulary
-from configs.paths import SPIDER_DEV_PATH
+from models.name_casting import NameCasting, build_candidate_pools
+from utils.vocab import load_noun_vocabulary, vocabulary_fingerprint
+from utils.schema import get_original_column_names
+from utils.embeddings import VocabMatrix, EmbeddingStore
+from models.schema_catalog import load_schema
+from configs.paths import SPIDER_DEV_PATH, SCHEMAS_PATH, EMBEDDINGS_PATH
 
-EMBEDDING_MODEL = fasttext.load_model("cc.en.300.bin")
+FASTTEXT_MODEL_PATH = "cc.en.300.bin"
+EMBEDDING_STORE_PATH = f"{EMBEDDINGS_PATH}cc.en.300"
+VOCAB_MATRIX_PATH = f"{EMBEDDINGS_PATH}noun_vocab_matrix"
 NOUN_VOCAB = load_noun_vocabulary()
 
+# per-process state of pool workers (memory-mapped, shared via page cache)
+WORKER_STATE = {}
+
+
+# inputs besides the schema names that determine a candidate pool
+def stamp_params(params):
+    return {
+        **params,
+        "vocab": vocabulary_fingerprint(),
+        "embedding_model": FASTTEXT_MODEL_PATH,
+    }
+
+# generate candidate pools for a batch of databases in one scoring pass
+def cast_databases(db_ids, embedding_model, vocab_matrix, params):
+
+    castings = []
+    for db in db_ids:
+        # init name casting
+        se = NameCasting(
+            embedding_model=embedding_model,
+            dataset="spider",
+            db_id=db
+        )
+
+        # collect original schema names
+        se.collect_names()
+        se.fingerprint = se.input_fingerprint(**stamp_params(params))
+        castings.append(se)
+
+    # generate candidate pools
+    build_candidate_pools(castings, vocab_matrix, **params)
+
+    return db_ids
+
+def init_worker():
+    WORKER_STATE["embedding_model"] = EmbeddingStore(EMBEDDING_STORE_PATH, model_path=FASTTEXT_MODEL_PATH)
+    WORKER_STATE["vocab_matrix"] = VocabMatrix.load(VOCAB_MATRIX_PATH)
+
+def cast_databases_worker(db_ids, params):
+    return cast_databases(db_ids, WORKER_STATE["embedding_model"], WORKER_STATE["vocab_matrix"], params)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
@@ -18,37 +66,68 @@ if __name__ == '__main__':
     parser.add_argument("--min_candidates", type=int, default=400)
     parser.add_argument("--max_candidates", type=int, default=1000)
     parser.add_argument("--anchor_k", type=int, default=30)
+    parser.add_argument("--batch_size", type=int, default=64) # databases scored per matrix product
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--force", action="store_true") # rebuild pools with unchanged inputs too
     args = parser.parse_args()
 
     with open(SPIDER_DEV_PATH, "r") as f:
         samples = json.load(f)
 
     databases = set([sample["db_id"] for sample in samples])
+    all_databases = sorted(databases)
 
-    for db in databases:
-        
-        # init name casting
-        se = NameCasting(
-            embedding_model=EMBEDDING_MODEL,
-            dataset="spider",
-            db_id=db
-        )
+    params = {
+        "sim_min": args.sim_min,
+        "sim_max": args.sim_max,
+        "sim_ambiguity": args.sim_ambiguity,
+        "anchor_k": args.anchor_k,
+        "max_candidates": args.max_candidates,
+        "min_candidates": args.min_candidates,
+    }
+
+    # skip databases whose pool was built from identical inputs
+    if not args.force:
+        outdated = set()
+        for db in databases:
+            se = NameCasting(embedding_model=None, dataset="spider", db_id=db)
+            if not se.is_up_to_date(se.input_fingerprint(**stamp_params(params))):
+                outdated.add(db)
+        databases = outdated
+    print(f"Generating candidate pools for {len(databases)} databases.")
+    if not databases: # nothing to do, skip loading the embeddings
+        sys.exit(0)
+
+    # words looked up during casting: noun vocab + all schema names
+    # (of every database, so a rebuild for new names keeps covering up-to-date ones)
+    store_words = set(NOUN_VOCAB)
+    for db in all_databases:
+        schema = load_schema(f"{SCHEMAS_PATH}spider", db)["schema"]
+        store_words.update(schema.keys())
+        store_words.update(get_original_column_names(schema))
+
+    # memory-mapped vectors, fastText is only loaded when the store is (re)built
+    EMBEDDING_MODEL = EmbeddingStore.open_or_build(
+        store_words, EMBEDDING_STORE_PATH, model_path=FASTTEXT_MODEL_PATH
+    )
+
+    # embed noun vocabulary once for all databases
+    vocab_matrix = VocabMatrix(NOUN_VOCAB, EMBEDDING_MODEL)
+
+    # score the vocabulary against a batch of databases in one pass
+    databases = sorted(databases)
+    if args.workers > 1:
+        # keep every worker busy
+        args.batch_size = max(1, min(args.batch_size, -(-len(databases) // args.workers)))
+    batches = [databases[i:i + args.batch_size] for i in range(0, len(databases), args.batch_size)]
+
+    if args.workers > 1:
+        # workers memory-map the matrix instead of holding their own copy
+        vocab_matrix.save(VOCAB_MATRIX_PATH)
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+            list(executor.map(cast_databases_worker, batches, [params] * len(batches)))
+    else:
+        for batch in batches:
+            cast_databases(batch, EMBEDDING_MODEL, vocab_matrix, params)
 
-        # collect original schema names
-        object_names = se.collect_names()
-
-        # compute schema centroid
-        cen = se.compute_schema_centroid()
-
-        # generate candidate pool
-        candidates = se.build_candidate_pool(
-            noun_vocab=NOUN_VOCAB,
-            sim_min=args.sim_min,
-            sim_max=args.sim_max,
-            sim_ambiguity=args.sim_ambiguity,
-            anchor_k=args.anchor_k,
-            max_candidates=args.max_candidates,
-            min_candidates=args.min_candidates
-        )
-        
     print("Candidate Name Generation finished.")
\ No newline at end of file
@@ -2,9 +2,13 @@
 import os
 import re
 import json
+import shutil
+import tempfile
 from tqdm import tqdm
 
 from configs.paths import SCHEMAS_PATH, RESULTS_PATH, SPIDER_DATABASE_PATH
+from utils.sqlite import is_overlay, materialize_overlay
+from models.schema_catalog import load_schema
 from external.testsuitesqleval.exec_eval import eval_exec_match
 
 
@@ -27,45 +31,51 @@ TABLE_REF_REGEX = re.compile(
 
 class Evaluator:
 
-    def __init__(self, dataset:str=None, db_size:str=None, model:str=None, f_suffix:bool=True, schema_filter:str=None):
+    def __init__(self, dataset:str=None, db_size:str=None, model:str=None, f_suffix:bool=True, schema_filter:str=None, schema_format:str="default", fk_expand:bool=False):
 
         self.dataset = dataset
         self.db_size = db_size
         self.f_suffix = f_suffix
-        self.schema_filter = schema_filter
+        self.schema_filter = f"{schema_filter}_fk" if schema_filter and fk_expand else schema_filter # fk expanded runs are stored separately
         self.model = model
+        self.format_suffix = "" if schema_format == "default" else f"_{schema_format}"
 
         # path definitions
         if db_size == "0":
             if dataset == "spider": 
                 self.db_path = SPIDER_DATABASE_PATH
                 self.schemas_path = f"{SCHEMAS_PATH}{self.dataset}/"
-                self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}_results.json"
-                self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}_eval.json"
+                self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}{self.format_suffix}_results.json"
+                self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}{self.format_suffix}_eval.json"
             else: raise Exception("Invalid dataset selection.")
         else:
             if self.f_suffix:
                 self.db_path = f"data/datasets/{dataset}_{db_size}_f/database/"
                 self.schemas_path = f"{SCHEMAS_PATH}{self.dataset}_{db_size}_f/"
                 if schema_filter:
-                    self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_f_{self.model}_{self.schema_filter}_results.json"
-                    self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_f_{self.model}_{self.schema_filter}_eval.json"
+                    self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_f_{self.model}_{self.schema_filter}{self.format_suffix}_results.json"
+                    self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_f_{self.model}_{self.schema_filter}{self.format_suffix}_eval.json"
                 else:
-                    self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_f_{self.model}_results.json"
-                    self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_f_{self.model}_eval.json"
+                    self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_f_{self.model}{self.format_suffix}_results.json"
+                    self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_f_{self.model}{self.format_suffix}_eval.json"
             else:
                 self.db_path = f"data/datasets/{dataset}_{db_size}/database/"
                 self.schemas_path = f"{SCHEMAS_PATH}{self.dataset}_{db_size}/"
 
                 if schema_filter:
-                    self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}_{self.schema_filter}_results.json"
-                    self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}_{self.schema_filter}_eval.json"
+                    self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}_{self.schema_filter}{self.format_suffix}_results.json"
+                    self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}_{self.schema_filter}{self.format_suffix}_eval.json"
                 else:
-                    self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}_results.json"
-                    self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}_eval.json"
+                    self.results_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}{self.format_suffix}_results.json"
+                    self.eval_path = f"{RESULTS_PATH}{self.dataset}_{self.db_size}_{self.model}{self.format_suffix}_eval.json"
 
         with open(self.results_path, "r") as f: 
             self.results = json.load(f)
+
+        # standalone copies of overlay variants (eval_exec_match opens db files itself)
+        self.materialized_dir = None
+        self.materialized_dbs = {}
+        self.overlay_dbs = {} # db_id -> is_overlay, checked once per db_id
         
     # generate scores
     def score_sql(self):
@@ -75,16 +85,19 @@ class Evaluator:
 
         total_score = 0
 
-        for _, result in tqdm(enumerate(self.results)):
+        try:
+            for _, result in tqdm(enumerate(self.results)):
 
-            db_id = result.get("db_id")
-            gold_sql = result.get("sql_gold")
-            pred_sql = result.get("response", {}).get("sql")
-            exec_score = self.execution_accuracy(db_id=db_id, gold_sql=gold_sql, pred_sql=pred_sql)
+                db_id = result.get("db_id")
+                gold_sql = result.get("sql_gold")
+                pred_sql = result.get("response", {}).get("sql")
+                exec_score = self.execution_accuracy(db_id=db_id, gold_sql=gold_sql, pred_sql=pred_sql)
 
-            total_score += exec_score
+                total_score += exec_score
 
-            result["execution_accuracy"] = exec_score
+                result["execution_accuracy"] = exec_score
+        finally:
+            self.cleanup_materialized()
         
         with open(self.eval_path, "w", encoding="utf-8") as f:
             json.dump(self.results, f, indent=4)
@@ -95,10 +108,9 @@ class Evaluator:
     # calculate exa
     def execution_accuracy(self, db_id:str, gold_sql:str, pred_sql:str):
 
-        db = f"{self.db_path}{db_id}/{db_id}.sqlite"
-
         if self.dataset == "spider":
             try:
+                db = self._resolve_db(db_id) # missing or unreadable variant files score 0
                 exec_score = eval_exec_match(db=db, p_str=pred_sql, g_str=gold_sql, plug_value=False, keep_distinct=True, progress_bar_for_each_datapoint=False)
             except:
                 exec_score = 0
@@ -107,6 +119,41 @@ class Evaluator:
         
         return exec_score
 
+    # sqlite file to evaluate on (overlay variants are materialized once per db_id)
+    def _resolve_db(self, db_id: str) -> str:
+        if db_id in self.materialized_dbs:
+            return self.materialized_dbs[db_id]
+
+        db = f"{self.db_path}{db_id}/{db_id}.sqlite"
+        if self.db_path == SPIDER_DATABASE_PATH:
+            return db
+        if db_id not in self.overlay_dbs:
+            self.overlay_dbs[db_id] = is_overlay(db)
+        if not self.overlay_dbs[db_id]:
+            return db
+
+        if self.materialized_dir is None:
+            self.materialized_dir = tempfile.mkdtemp(prefix="t2sql_overlay_")
+
+        # keep one copy at a time (samples are grouped by db_id)
+        for other in self.materialized_dbs.values():
+            shutil.rmtree(os.path.dirname(other), ignore_errors=True)
+        self.materialized_dbs = {}
+
+        # own directory per db_id, eval_exec_match considers all sqlite files next to db
+        self.materialized_dbs[db_id] = materialize_overlay(
+            db,
+            original_path=f"{SPIDER_DATABASE_PATH}{db_id}/{db_id}.sqlite",
+            out_path=f"{self.materialized_dir}/{db_id}/{db_id}.sqlite",
+        )
+        return self.materialized_dbs[db_id]
+
+    def cleanup_materialized(self):
+        if self.materialized_dir:
+            shutil.rmtree(self.materialized_dir, ignore_errors=True)
+        self.materialized_dir = None
+        self.materialized_dbs = {}
+
     # print overall exa
     def analyze_exa(self):
         # eval file needs to be created first
@@ -187,13 +234,14 @@ class Evaluator:
             # analyze synthetic tables used
             db_id = sample['db_id']
             if db_id not in synthetic_table_names: # synthetic tables of db_id not already extracted
-                with open(f"{SCHEMAS_PATH}{self.dataset}/{db_id}.json", "r") as f:
-                    original_schema = json.load(f)
-                with open(f"{self.schemas_path}/{db_id}.json", "r") as f:
-                    enlarged_schema = json.load(f)
+                enlarged_schema = load_schema(self.schemas_path, db_id)
 
-                # add all tables of enlarged schemas that do not appear in original schema to synthetic names
-                synthetic_table_names[db_id] = [tbl for tbl in enlarged_schema["schema"].keys() if tbl not in original_schema["schema"].keys()]
+                if "synthetic_tables" in enlarged_schema: # delta encoded schema
+                    synthetic_table_names[db_id] = enlarged_schema["synthetic_tables"]
+                else:
+                    original_schema = load_schema(f"{SCHEMAS_PATH}{self.dataset}", db_id)
+                    # add all tables of enlarged schemas that do not appear in original schema to synthetic names
+                    synthetic_table_names[db_id] = [tbl for tbl in enlarged_schema["schema"].keys() if tbl not in original_schema["schema"].keys()]
             
             pred_sql = sample["response"]["sql"] or ""
 
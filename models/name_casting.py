@@ -1,11 +1,13 @@
 import os
 import json
+import hashlib
 import numpy as np
-from tqdm import tqdm
 from typing import List
 
 from configs.paths import SCHEMAS_PATH, CANDIDATE_PATH
-from utils.embeddings import embed_word, cosine_sim
+from utils.embeddings import embed_word, VocabMatrix
+from utils.schema import get_original_column_names
+from models.schema_catalog import load_schema
 
 
 SQL_KEYWORDS = {
@@ -38,15 +40,32 @@ class NameCasting:
 
         # load schema representations
         self.schema_path = f"{SCHEMAS_PATH}{dataset}/{db_id}.json"
-        with open(self.schema_path, "r") as f:
-            schema = json.load(f)
+        schema = load_schema(f"{SCHEMAS_PATH}{dataset}", db_id)
 
         self.schema_original = schema["schema"]
         self.embedding_model = embedding_model
 
+        self.candidate_path = f"{CANDIDATE_PATH}{dataset}/{db_id}.json"
+        self.stamp_path = f"{CANDIDATE_PATH}{dataset}/{db_id}.stamp.json"
+        self.fingerprint = None # stamped next to the pool when set
+
         os.makedirs(CANDIDATE_PATH, exist_ok=True)
         os.makedirs(f"{CANDIDATE_PATH}{dataset}", exist_ok=True)
 
+    # hash of the schema names and everything else the candidate pool depends on
+    # (vocabulary version, embedding model, build_candidate_pool parameters)
+    def input_fingerprint(self, **params) -> str:
+        names = set(self.schema_original.keys()) | get_original_column_names(self.schema_original)
+        key = json.dumps({"names": sorted(names), "params": params}, sort_keys=True)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    # pool on disk was built from the same inputs
+    def is_up_to_date(self, fingerprint: str) -> bool:
+        if not (os.path.exists(self.candidate_path) and os.path.exists(self.stamp_path)):
+            return False
+        with open(self.stamp_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("fingerprint") == fingerprint
+
     # collect origina schema names
     def collect_names(self) -> List[str]:
         names = set()
@@ -99,70 +118,74 @@ class NameCasting:
         max_candidates=400,
         min_candidates=200,
         anchor_k=30,
+        vocab_matrix: VocabMatrix = None,
     ):
-        # initial centroid
-        self.compute_schema_centroid()
-
-        # 🆕 expand anchors if schema is small
-        if len(self.schema_vocab) < 30:
-            self._expand_schema_anchors(noun_vocab, k=anchor_k)
-
-        # first pass
-        candidates = self._collect_candidates(
-            noun_vocab,
-            sim_min,
-            sim_max,
-            sim_ambiguity,
+        # embed vocabulary once (pass a shared matrix when casting many databases)
+        if vocab_matrix is None:
+            vocab_matrix = VocabMatrix(noun_vocab, self.embedding_model)
+
+        # all similarities are computed once, selection is a range query
+        index = self.build_similarity_index(vocab_matrix, anchor_k=anchor_k)
+
+        pool = index.select(
+            sim_min=sim_min,
+            sim_max=sim_max,
+            sim_ambiguity=sim_ambiguity,
+            max_candidates=max_candidates,
+            min_candidates=min_candidates,
         )
+        return self.save_candidate_pool(pool)
 
-        # 🆕 adaptive relaxation
-        relax_steps = 0
-        while len(candidates) < min_candidates and relax_steps < 4:
-            sim_min = max(0.10, sim_min - 0.05)
-            sim_max = min(0.90, sim_max + 0.05)
-
-            candidates = self._collect_candidates(
-                noun_vocab,
-                sim_min,
-                sim_max,
-                sim_ambiguity,
-            )
-            relax_steps += 1
-
-        candidates.sort(key=lambda x: -x[1])
-        self.candidate_pool = [w for w, _ in candidates[:max_candidates]]
+    # store candidate pool as json
+    def save_candidate_pool(self, pool: List[str]) -> List[str]:
+        self.candidate_pool = pool
 
         with open(
-            f"{CANDIDATE_PATH}{self.dataset}/{self.db_id}.json",
+            self.candidate_path,
             "w",
             encoding="utf-8",
         ) as f:
             json.dump(self.candidate_pool, f, indent=4)
 
+        if self.fingerprint:
+            with open(self.stamp_path, "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": self.fingerprint}, f)
+
         return self.candidate_pool
 
+    # score the vocabulary against this schema once (use for parameter sweeps)
+    def build_similarity_index(self, vocab_matrix: VocabMatrix, anchor_k=30):
+        return build_similarity_indexes([self], vocab_matrix, anchor_k=anchor_k)[0]
+
+    # index over the non-excluded vocab words given precomputed scores
+    def _make_similarity_index(self, vocab_matrix: VocabMatrix, sims: np.ndarray, ambiguity: np.ndarray):
+        excluded = vocab_matrix.mask(self.schema_vocab) | vocab_matrix.mask(SQL_KEYWORDS)
+        keep = np.flatnonzero(~excluded)
+
+        self.similarity_index = SimilarityIndex(
+            [vocab_matrix.words[i] for i in keep],
+            sims[keep],
+            ambiguity[keep],
+        )
+        return self.similarity_index
+
     # expand schema semantics in case of small and narrow schema space
     def _expand_schema_anchors(
         self,
-        noun_vocab: set[str],
+        vocab_matrix: VocabMatrix,
         k: int = 30,
         min_sim: float = 0.15,
+        sims: np.ndarray = None,
     ):
-        
-        scored = []
 
-        for w in noun_vocab:
-            if w in self.schema_vocab:
-                continue
-            if w not in self.embedding_model:
-                continue
-            v = embed_word(w, self.embedding_model)
-            sim = cosine_sim(v, self.centroid)
-            if sim >= min_sim:
-                scored.append((w, sim))
+        # similarities to the current centroid (precomputed in batch mode)
+        if sims is None:
+            sims = vocab_matrix.similarities(self.centroid)[:, 0]
+        eligible = ~vocab_matrix.mask(self.schema_vocab) & (sims >= min_sim)
 
-        scored.sort(key=lambda x: -x[1])
-        extra = [w for w, _ in scored[:k]]
+        idx = np.flatnonzero(eligible)
+        top = idx[np.argsort(-sims[idx], kind="stable")][:k]
+        extra = [vocab_matrix.words[i] for i in top]
 
         # add to schema vocab + vectors
         for w in extra:
@@ -173,43 +196,141 @@ class NameCasting:
         self.centroid = np.mean(list(self.schema_vectors.values()), axis=0)
 
         return extra
-    
-    # collect candidate words
-    def _collect_candidates(
-        self,
-        noun_vocab,
-        sim_min,
-        sim_max,
-        sim_ambiguity,
-    ):
-        candidates = []
 
-        for w in tqdm(noun_vocab):
-            if w in self.schema_vocab:
-                continue
-            if w in SQL_KEYWORDS:
-                continue
-            if w not in self.embedding_model:
-                continue
 
-            v = embed_word(w, self.embedding_model)
-            sim = cosine_sim(v, self.centroid)
+# score the vocabulary against many databases at once
+def build_similarity_indexes(castings: List[NameCasting], vocab_matrix: VocabMatrix, anchor_k=30) -> List["SimilarityIndex"]:
+
+    # initial centroids
+    for nc in castings:
+        nc.compute_schema_centroid()
+
+    # 🆕 expand anchors of all small schemas from one product
+    small = [nc for nc in castings if len(nc.schema_vocab) < 30]
+    if small:
+        sims = vocab_matrix.similarities(np.stack([nc.centroid for nc in small]))
+        for j, nc in enumerate(small):
+            nc._expand_schema_anchors(vocab_matrix, k=anchor_k, sims=sims[:, j])
+
+    # similarity of every vocab word to every centroid
+    sims = vocab_matrix.similarities(np.stack([nc.centroid for nc in castings]))
+
+    # max similarity of every vocab word to any schema name, per database
+    schema_vectors = [np.stack(list(nc.schema_vectors.values())) for nc in castings]
+    offsets = np.cumsum([0] + [len(v) for v in schema_vectors[:-1]])
+    ambiguity = vocab_matrix.max_similarities(np.concatenate(schema_vectors), offsets)
+
+    return [
+        nc._make_similarity_index(vocab_matrix, sims[:, j], ambiguity[:, j])
+        for j, nc in enumerate(castings)
+    ]
+
+# candidate pools of many databases from one batched scoring pass
+def build_candidate_pools(
+    castings: List[NameCasting],
+    vocab_matrix: VocabMatrix,
+    sim_min=0.25,
+    sim_max=0.55,
+    sim_ambiguity=0.75,
+    max_candidates=400,
+    min_candidates=200,
+    anchor_k=30,
+) -> dict:
+
+    indexes = build_similarity_indexes(castings, vocab_matrix, anchor_k=anchor_k)
+
+    pools = {}
+    for nc, index in zip(castings, indexes):
+        pool = index.select(
+            sim_min=sim_min,
+            sim_max=sim_max,
+            sim_ambiguity=sim_ambiguity,
+            max_candidates=max_candidates,
+            min_candidates=min_candidates,
+        )
+        pools[nc.db_id] = nc.save_candidate_pool(pool)
+
+    return pools
+
+
+class SimilarityIndex:
+
+    """
+    Candidate words of one database sorted by similarity to the schema centroid
+    Keeps the max similarity to any schema name next to it for the ambiguity check
+    Threshold windows (and their relaxation) are answered by binary search
+    """
 
-            if sim < sim_min or sim > sim_max:
-                continue
+    def __init__(self, words: List[str], sims: np.ndarray, ambiguity: np.ndarray):
+        sims = np.asarray(sims, dtype=np.float64)
+        ambiguity = np.asarray(ambiguity, dtype=np.float64)
 
-            # ambiguity check
-            ambiguous = False
-            for schema_vec in self.schema_vectors.values():
-                if cosine_sim(v, schema_vec) > sim_ambiguity:
-                    ambiguous = True
-                    break
+        # descending similarity, ties keep vocabulary order
+        order = np.argsort(-sims, kind="stable")
+        self.words = [words[i] for i in order]
+        self.sims = sims[order]
+        self.ambiguity = ambiguity[order]
+        self._neg_sims = -self.sims # ascending for searchsorted
 
-            if not ambiguous:
-                candidates.append((w, sim))
+    def __len__(self):
+        return len(self.words)
 
-        return candidates
+    # positions of words with sim_min <= sim <= sim_max and no ambiguity
+    def _positions(self, sim_min, sim_max, sim_ambiguity) -> np.ndarray:
+        lo = np.searchsorted(self._neg_sims, -sim_max, side="left")
+        hi = np.searchsorted(self._neg_sims, -sim_min, side="right")
+        if hi <= lo:
+            return np.empty(0, dtype=np.int64)
+        window = np.arange(lo, hi)
+        return window[self.ambiguity[lo:hi] <= sim_ambiguity]
 
+    def count(self, sim_min, sim_max, sim_ambiguity) -> int:
+        return len(self._positions(sim_min, sim_max, sim_ambiguity))
+
+    # candidates inside the window, best first
+    def query(self, sim_min, sim_max, sim_ambiguity, max_candidates=None) -> List[str]:
+        positions = self._positions(sim_min, sim_max, sim_ambiguity)[:max_candidates]
+        return [self.words[i] for i in positions]
+
+    # window query with the adaptive relaxation of build_candidate_pool
+    def select(
+        self,
+        sim_min=0.25,
+        sim_max=0.55,
+        sim_ambiguity=0.75,
+        max_candidates=400,
+        min_candidates=200,
+    ) -> List[str]:
 
+        # 🆕 adaptive relaxation
+        relax_steps = 0
+        while self.count(sim_min, sim_max, sim_ambiguity) < min_candidates and relax_steps < 4:
+            sim_min = max(0.10, sim_min - 0.05)
+            sim_max = min(0.90, sim_max + 0.05)
+            relax_steps += 1
 
+        return self.query(sim_min, sim_max, sim_ambiguity, max_candidates)
 
+    # candidate pools for every parameter combination of a grid
+    def sweep(
+        self,
+        sim_min_values,
+        sim_max_values,
+        sim_ambiguity_values,
+        max_candidates_values,
+        min_candidates=200,
+    ) -> dict:
+
+        pools = {}
+        for sim_min in sim_min_values:
+            for sim_max in sim_max_values:
+                for sim_ambiguity in sim_ambiguity_values:
+                    for max_candidates in max_candidates_values:
+                        pools[(sim_min, sim_max, sim_ambiguity, max_candidates)] = self.select(
+                            sim_min=sim_min,
+                            sim_max=sim_max,
+                            sim_ambiguity=sim_ambiguity,
+                            max_candidates=max_candidates,
+                            min_candidates=min_candidates,
+                        )
+        return pools
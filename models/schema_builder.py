@@ -1,8 +1,10 @@
 import os
-import json
-import random
 import sqlite3
-from configs.paths import SCHEMAS_PATH, SPIDER_DATABASE_PATH
+from collections.abc import Mapping
+from configs.paths import SCHEMAS_PATH, INTROSPECTED_SCHEMAS_PATH, DATASETS_PATH, SPIDER_DATABASE_PATH
+from utils.sqlite import OVERLAY_SCHEMA, connect as connect_sqlite, is_overlay, file_stamp, matches_stamp
+from models.schema_catalog import save_schema, load_schema
+from models.schema_renderer import SchemaRenderer
 
 class SchemaBuilder:
 
@@ -22,10 +24,28 @@ class SchemaBuilder:
         self.reset()
 
         if dataset == "spider":
-            self.db_path = f"{SPIDER_DATABASE_PATH}{db_id}/{db_id}.sqlite"
+            self.original_db_path = f"{SPIDER_DATABASE_PATH}{db_id}/{db_id}.sqlite"
         else:
             raise ValueError(f"Unknown dataset [{dataset}]")
 
+        # scaled variants (may be overlays holding only the synthetic tables)
+        if str(db_size) == "0":
+            self.db_path = self.original_db_path
+            self.schemas_dir = f"{SCHEMAS_PATH}{dataset}"
+        elif applyChallenges:
+            self.db_path = f"{DATASETS_PATH}{dataset}_{db_size}_f/database/{db_id}/{db_id}.sqlite"
+            self.schemas_dir = f"{SCHEMAS_PATH}{dataset}_{db_size}_f"
+        else:
+            self.db_path = f"{DATASETS_PATH}{dataset}_{db_size}/database/{db_id}/{db_id}.sqlite"
+            self.schemas_dir = f"{SCHEMAS_PATH}{dataset}_{db_size}"
+
+        # schemas built here from the sqlite files, kept apart from the scaler's schemas of a variant
+        # (those may be deltas and carry synthetic_tables, which introspection cannot recover)
+        if str(db_size) == "0":
+            self.build_dir = self.schemas_dir
+        else:
+            self.build_dir = self.schemas_dir.replace(SCHEMAS_PATH, INTROSPECTED_SCHEMAS_PATH, 1)
+
         os.makedirs(SCHEMAS_PATH, exist_ok=True)
         os.makedirs(f"{SCHEMAS_PATH}{dataset}", exist_ok=True)
 
@@ -38,9 +58,9 @@ class SchemaBuilder:
 
     
     
-    #  establish sqlite connection
+    #  establish sqlite connection (original attached for overlay variants)
     def connect(self):
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = connect_sqlite(self.db_path, original_path=self.original_db_path)
         self.cursor = self.conn.cursor()
 
     # close sqlite connection
@@ -61,6 +81,7 @@ class SchemaBuilder:
         self.foreign_keys = {}
         self.columns = {}
         self.schema_object = None
+        self._renderer = None
 
         
     def _get_tables(self):
@@ -72,12 +93,28 @@ class SchemaBuilder:
                   WHERE type='table' 
                   AND name NOT LIKE 'sqlite_%';
               """
+        if self._is_attached_overlay():
+            # original tables first, as in a full copy
+            sql = f""" SELECT name
+                       FROM {OVERLAY_SCHEMA}.sqlite_master
+                       WHERE type='table'
+                       AND name NOT LIKE 'sqlite_%'
+                       UNION ALL
+                       SELECT name
+                       FROM main.sqlite_master
+                       WHERE type='table'
+                       AND name NOT LIKE 'sqlite_%';
+                   """
         self.cursor.execute(sql)
         tables = to_dict(cursor=self.cursor)
         
         if tables:
             self.tables = [table["name"] for table in tables]
         
+    def _is_attached_overlay(self) -> bool:
+        self.cursor.execute("PRAGMA database_list;")
+        return any(row[1] == OVERLAY_SCHEMA for row in self.cursor.fetchall())
+
     def _get_primary_keys(self):
 
         self.primary_keys = {} # reset primary keys
@@ -146,11 +183,73 @@ class SchemaBuilder:
         
         self.columns = cols
     
-    def build_schema_object(self):
-        self._get_tables()
-        self._get_primary_keys()
-        self._get_foreign_keys()
-        self._get_columns()
+    # tables, columns, pks and fks in two set-based queries
+    # (same result as the per-table _get_* methods above)
+    def _introspect(self):
+
+        self.tables = []
+        self.primary_keys = {}
+        self.foreign_keys = {}
+        self.columns = {}
+
+        # original tables first for overlays, as in a full copy
+        schemas = [OVERLAY_SCHEMA, "main"] if self._is_attached_overlay() else ["main"]
+
+        def union(select):
+            return "\nUNION ALL\n".join(
+                select.format(src=i, schema=schema) for i, schema in enumerate(schemas)
+            )
+
+        masters = union(
+            """ SELECT {src} AS src, m.rowid AS ord, m.name AS tbl, '{schema}' AS sch
+                FROM {schema}.sqlite_master AS m
+                WHERE m.type='table'
+                AND m.name NOT LIKE 'sqlite_%'
+            """
+        )
+
+        self.cursor.execute(
+            f""" SELECT t.tbl, p.name, p.type, p."notnull", p.pk
+                 FROM ({masters}) AS t
+                 LEFT JOIN pragma_table_info(t.tbl, t.sch) AS p
+                 ORDER BY t.src, t.ord, p.cid;
+             """
+        )
+        for table, name, col_type, notnull, pk in self.cursor.fetchall():
+            if table not in self.columns:
+                self.tables.append(table)
+                self.columns[table] = []
+            if name is None: # table without columns
+                continue
+            self.columns[table].append({"name": name,
+                                        "type": col_type,
+                                        "typegroup": normalize_type(col_type),
+                                        "notnull": bool(notnull),
+                                        "pk": pk})
+            if pk > 0:
+                self.primary_keys.setdefault(table, []).append(name)
+        self.columns = {t: cols for t, cols in self.columns.items() if cols}
+
+        self.cursor.execute(
+            f""" SELECT t.tbl, f."table", f."to", f."from"
+                 FROM ({masters}) AS t
+                 JOIN pragma_foreign_key_list(t.tbl, t.sch) AS f
+                 ORDER BY t.src, t.ord, f.id, f.seq;
+             """
+        )
+        for table, source_table, source_column, target_column in self.cursor.fetchall():
+            self.foreign_keys.setdefault(table, []).append({"sourceTable": source_table,
+                                                            "sourceColumn": source_column,
+                                                            "targetColumn": target_column})
+
+    def build_schema_object(self, single_query: bool = True):
+        if single_query:
+            self._introspect()
+        else:
+            self._get_tables()
+            self._get_primary_keys()
+            self._get_foreign_keys()
+            self._get_columns()
 
         obj = {"dataset": self.dataset, "db_id": self.db_id, "schema": {}}
         for table in self.tables:
@@ -159,36 +258,49 @@ class SchemaBuilder:
                 "primary_keys": self.primary_keys.get(table, []),
                 "foreign_keys": self.foreign_keys.get(table, [])
             }
+        obj["source"] = self.source_stamp()
         self.schema_object = obj
         return obj
 
-    # save schema object as json
-    def save_schema_json(self):
+    # stamp of the database file(s) the schema is built from
+    def source_stamp(self, previous: dict = None) -> dict:
+        previous = previous or {}
+        stamp = file_stamp(self.db_path, previous=previous)
+        if self.db_path != self.original_db_path and is_overlay(self.db_path):
+            stamp["original"] = file_stamp(self.original_db_path, previous=previous.get("original"))
+        return stamp
+
+    # stored schema was built from the current database file(s)
+    def is_up_to_date(self) -> bool:
+        try:
+            stamp = load_schema(self.build_dir, self.db_id).get("source")
+        except FileNotFoundError:
+            return False
+
+        if not matches_stamp(self.db_path, stamp):
+            return False
+        if "original" in stamp:
+            return matches_stamp(self.original_db_path, stamp["original"])
+        return not (self.db_path != self.original_db_path and is_overlay(self.db_path))
+
+    # save schema object as json (or into the schema catalog of the variant) in build_dir
+    def save_schema_json(self, use_catalog: bool = False, verbose: bool = True):
         if not self.schema_object:
             raise ValueError("Build schema before saving it.")
-        
-        out_path = f"{SCHEMAS_PATH}{self.dataset}/{self.db_id}.json"
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(self.schema_object, f, indent=4)
-        
-        print(f"✅ Schema saved to {out_path}")
 
-    # load schema object from json
+        out_path = save_schema(self.build_dir, self.schema_object, use_catalog=use_catalog)
+        if verbose:
+            print(f"✅ Schema saved to {out_path}")
+
+    # load schema object from the variant catalog or its json file
     def load_schema_json(self, repopulate_attributes=True):
         
-        if self.db_size == 0:
-            path = f"{SCHEMAS_PATH}{self.dataset}/{self.db_id}.json"
-        else:
-            if self.applyChallenges:
-                path = f"{SCHEMAS_PATH}{self.dataset}_{self.db_size}_f/{self.db_id}.json"
-            else:
-                path = f"{SCHEMAS_PATH}{self.dataset}_{self.db_size}/{self.db_id}.json"
-
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"No schema file found at {path}")
-
-        with open(path, "r", encoding="utf-8") as f:
-            self.schema_object = json.load(f)
+        # variants are loaded and rendered once per process
+        self._renderer = SchemaRenderer.for_variant(
+            (self.schemas_dir, self.db_id),
+            lambda: load_schema(self.schemas_dir, self.db_id)
+        )
+        self.schema_object = self._renderer.schema_object
 
         if repopulate_attributes:
             self.tables = list(self.schema_object.keys())
@@ -199,8 +311,9 @@ class SchemaBuilder:
         return self.schema_object
 
     @classmethod
-    def load_schema_dict(cls, schema_object: dict):
+    def load_schema_dict(cls, schema_object: Mapping):
         # Create an instance with minimal required constructor args
+        # (schema_object may be a read-only SchemaView of a filtered schema)
         dataset = schema_object.get("dataset")
         db_id = schema_object.get("db_id")
 
@@ -210,51 +323,17 @@ class SchemaBuilder:
 
         return sb
 
-    def generate_schema_string(self, randomize_table_order:bool=False):
-
+    # fragment cached renderer of the current schema object
+    @property
+    def renderer(self) -> SchemaRenderer:
         if not self.schema_object:
             raise RuntimeError("Schema object is not populated!")
-        
-        foreign_keys = []
-
-        # db_id
-        schema_string = f"## Database Name: {self.schema_object['db_id']} \n\n"
-
-        # schema
-        schema_string += "## Database Schema \n\n"
-
-        items = list(self.schema_object["schema"].items())
-        if randomize_table_order:
-            random.shuffle(items)
-
-        # tables with columns
-        for table_name, table_object in items:
-
-            schema_string += f"# Table: {table_name}\n[\n"
-            
-            for column_object in table_object["columns"]:
-                schema_string += f"({column_object['name']}: {column_object['type'].upper()},"
-                if column_object['pk'] == 1:
-                    schema_string += " PRIMARY KEY,"
-                if not column_object['notnull']:
-                    schema_string += " NOT NULL"                
-                schema_string += "),\n"
-            schema_string += "]\n\n"
-
-            for fk in table_object.get("foreign_keys", []):
-                # foreign key column on this table
-                fk_identifier = f"{table_name}.{fk['targetColumn']}"
-                # PK it references:
-                pk_identifier = f"{fk['sourceTable']}.{fk['sourceColumn']}"
-                foreign_keys.append((fk_identifier, pk_identifier))
-        
-        # foreign keys
-        if foreign_keys:
-            schema_string += "## Foreign Keys \n"
-            for fk_identifier, pk_identifier in foreign_keys:
-                schema_string += f"{fk_identifier} REFERENCES {pk_identifier}\n"
+        if self._renderer is None or self._renderer.schema_object is not self.schema_object:
+            self._renderer = SchemaRenderer(self.schema_object)
+        return self._renderer
 
-        return schema_string
+    def generate_schema_string(self, randomize_table_order:bool=False, tables:list=None, schema_format:str="default"):
+        return self.renderer.render(tables=tables, randomize_table_order=randomize_table_order, schema_format=schema_format)
 
 
 # utilities
@@ -0,0 +1,134 @@
+import os
+import json
+import zlib
+import sqlite3
+
+from configs.paths import SCHEMAS_PATH
+from utils.schema import is_schema_delta, resolve_schema_delta
+
+CATALOG_FILE = "catalog.sqlite"
+
+class SchemaCatalog:
+
+    """
+    Schema objects of one variant in a single SQLite file, indexed by db_id
+    Schemas are stored as zlib-compressed compact json and decoded on access
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # parallel scalers write to the same catalog
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS schemas (db_id TEXT PRIMARY KEY, data BLOB NOT NULL);")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+        self.conn = None
+
+    def __contains__(self, db_id: str):
+        return self.conn.execute("SELECT 1 FROM schemas WHERE db_id = ?;", (db_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM schemas;").fetchone()[0]
+
+    def db_ids(self) -> list:
+        return [row[0] for row in self.conn.execute("SELECT db_id FROM schemas ORDER BY db_id;")]
+
+    # store (or replace) a schema object
+    def put(self, schema_object: dict) -> None:
+        data = zlib.compress(json.dumps(schema_object, separators=(",", ":")).encode("utf-8"))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO schemas (db_id, data) VALUES (?, ?);",
+            (schema_object["db_id"], data)
+        )
+        self.conn.commit()
+
+    def delete(self, db_id: str) -> None:
+        self.conn.execute("DELETE FROM schemas WHERE db_id = ?;", (db_id,))
+        self.conn.commit()
+
+    # decode a single schema object, None if db_id is not in the catalog
+    def get(self, db_id: str) -> dict:
+        row = self.conn.execute("SELECT data FROM schemas WHERE db_id = ?;", (db_id,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    # pack all json schema files of a variant directory into the catalog
+    def import_json_dir(self, schemas_dir: str) -> int:
+        n = 0
+        for name in sorted(os.listdir(schemas_dir)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(schemas_dir, name), "r", encoding="utf-8") as f:
+                self.put(json.load(f))
+            n += 1
+        return n
+
+
+# catalog file of a variant schema directory
+def catalog_path(schemas_dir: str) -> str:
+    return os.path.join(schemas_dir, CATALOG_FILE)
+
+# open catalogs, one connection per variant and process (connections do not survive a fork)
+_CATALOGS = {}
+
+def open_catalog(schemas_dir: str) -> SchemaCatalog:
+    key = (catalog_path(schemas_dir), os.getpid())
+    if key not in _CATALOGS:
+        _CATALOGS[key] = SchemaCatalog(key[0])
+    return _CATALOGS[key]
+
+def schema_json_path(schemas_dir: str, db_id: str) -> str:
+    return os.path.join(schemas_dir, f"{db_id}.json")
+
+# store a schema object in the catalog or as json file of the variant and drop
+# the copy in the other format, so load_schema never returns an outdated schema
+def save_schema(schemas_dir: str, schema_object: dict, use_catalog: bool = False) -> str:
+    os.makedirs(schemas_dir, exist_ok=True)
+    json_path = schema_json_path(schemas_dir, schema_object["db_id"])
+
+    if use_catalog:
+        catalog = open_catalog(schemas_dir)
+        catalog.put(schema_object)
+        if os.path.exists(json_path):
+            os.remove(json_path)
+        return catalog.path
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(schema_object, f, indent=4)
+    if os.path.exists(catalog_path(schemas_dir)):
+        open_catalog(schemas_dir).delete(schema_object["db_id"])
+    return json_path
+
+# schema object of db_id from the variant catalog, falls back to the json file
+# (delta encoded schemas are resolved against their original schema)
+def load_schema(schemas_dir: str, db_id: str) -> dict:
+    schema_object = None
+    if os.path.exists(catalog_path(schemas_dir)):
+        schema_object = open_catalog(schemas_dir).get(db_id)
+
+    if schema_object is None:
+        path = schema_json_path(schemas_dir, db_id)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No schema file found at {path}")
+
+        with open(path, "r", encoding="utf-8") as f:
+            schema_object = json.load(f)
+
+    if is_schema_delta(schema_object):
+        base_dataset = schema_object["base"]["dataset"]
+        original = load_schema(f"{SCHEMAS_PATH}{base_dataset}", db_id)
+        return resolve_schema_delta(schema_object, original["schema"])
+
+    return schema_object
\ No newline at end of file
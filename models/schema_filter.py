@@ -1,17 +1,61 @@
 
 import numpy as np
-from copy import deepcopy
 from rank_bm25 import BM25Okapi
 from sentence_transformers import SentenceTransformer
 
-from utils.filter import normalize, table_to_document, table_to_text
+from configs.paths import EMBEDDINGS_PATH
+from utils.bm25 import SparseBM25
+from utils.schema import SchemaView
+from models.schema_graph import FKGraph
+from utils.embeddings import TextEmbeddingCache
+from utils.filter import normalize, table_to_document, table_to_text, top_k_indices
+
+TABLE_EMBEDDING_CACHE_PATH = f"{EMBEDDINGS_PATH}table_embeddings.sqlite"
+
+# one sentence transformer per model and process, shared by all dense filters
+_SENTENCE_MODELS = {}
+
+def get_sentence_model(model_name: str) -> SentenceTransformer:
+    if model_name not in _SENTENCE_MODELS:
+        _SENTENCE_MODELS[model_name] = SentenceTransformer(model_name)
+    return _SENTENCE_MODELS[model_name]
+
+_EMBEDDING_CACHES = {}
+
+def get_embedding_cache(path: str = TABLE_EMBEDDING_CACHE_PATH) -> TextEmbeddingCache:
+    if path not in _EMBEDDING_CACHES:
+        _EMBEDDING_CACHES[path] = TextEmbeddingCache(path)
+    return _EMBEDDING_CACHES[path]
+
+# normalized question embeddings in one batched (and cached) pass
+def encode_questions(questions: list, model_name: str = "all-MiniLM-L6-v2", use_cache: bool = True, batch_size: int = 256) -> np.ndarray:
+    model = get_sentence_model(model_name)
+    if use_cache:
+        return get_embedding_cache().encode(
+            questions,
+            model,
+            f"{model_name}/normalized",
+            normalize_embeddings=True,
+            batch_size=batch_size,
+            show_progress_bar=False
+        )
+    return model.encode(
+        questions,
+        normalize_embeddings=True,
+        batch_size=batch_size,
+        show_progress_bar=False
+    )
+
 
 class BM25SchemaFilter:
     
-    def __init__(self, schema_json):
+    # fk_expansion: FKGraph.connect arguments (max_new, token_budget, table_cost) to add connecting tables
+    def __init__(self, schema_json, engine="sparse", fk_expansion: dict = None):
         self.schema_json = schema_json
         self.table_names = []
         self.documents = []
+        self.fk_expansion = fk_expansion
+        self.fk_graph = FKGraph(schema_json) if fk_expansion is not None else None
 
         for table_name, table_def in schema_json["schema"].items():
             self.table_names.append(table_name)
@@ -19,49 +63,55 @@ class BM25SchemaFilter:
                 table_to_document(table_name, table_def)
             )
 
-        self.bm25 = BM25Okapi(self.documents)
+        # sparse engine scores like BM25Okapi, rank_bm25 kept as reference
+        if engine == "sparse":
+            self.bm25 = SparseBM25(self.documents)
+        elif engine == "rank_bm25":
+            self.bm25 = BM25Okapi(self.documents)
+        else:
+            raise ValueError(f"Unknown BM25 engine [{engine}]")
 
     def filter(self, question: str, top_k: int = 5):
         query_tokens = normalize(question)
         scores = self.bm25.get_scores(query_tokens)
 
-        ranked = sorted(
-            zip(self.table_names, scores),
-            key=lambda x: x[1],
-            reverse=True
-        )
+        return self._compress_schema(self._select(scores, top_k))
 
-        selected_tables = {
-            name for name, _ in ranked[:top_k]
-        }
+    # filter many questions of this schema with one scoring pass
+    def filter_many(self, questions: list, top_k: int = 5) -> list:
+        if not isinstance(self.bm25, SparseBM25):
+            return [self.filter(question, top_k=top_k) for question in questions]
 
-        return self._compress_schema(selected_tables)
+        scores = self.bm25.get_batch_scores([normalize(q) for q in questions])
+        return [
+            self._compress_schema(self._select(scores[:, j], top_k))
+            for j in range(len(questions))
+        ]
 
-    # keep only selected tables and valid foreign keys
-    def _compress_schema(self, selected_tables):
-        compressed = deepcopy(self.schema_json)
-        compressed["schema"] = {
-            t: compressed["schema"][t]
-            for t in selected_tables
-        }
+    # names of the top_k tables (ties keep schema order) + fk connecting tables
+    def _select(self, scores, top_k):
+        ranked = [self.table_names[i] for i in top_k_indices(scores, top_k)]
+        if self.fk_graph is not None:
+            ranked = self.fk_graph.connect(ranked, **self.fk_expansion)
+        return set(ranked)
 
-        # remove foreign keys pointing to removed tables
-        for table in compressed["schema"].values():
-            table["foreign_keys"] = [
-                fk for fk in table.get("foreign_keys", [])
-                if fk["sourceTable"] in selected_tables
-            ]
-
-        return compressed
+    # keep only selected tables and valid foreign keys (read-only view, no copy)
+    def _compress_schema(self, selected_tables):
+        return SchemaView(
+            self.schema_json,
+            [t for t in self.table_names if t in selected_tables]
+        )
 
 
 
 class DenseSchemaFilter:
 
-    def __init__(self, schema_json, model_name="all-MiniLM-L6-v2"):
+    def __init__(self, schema_json, model_name="all-MiniLM-L6-v2", use_cache=True, fk_expansion: dict = None):
         self.schema_json = schema_json
         self.table_names = []
         self.table_texts = []
+        self.fk_expansion = fk_expansion
+        self.fk_graph = FKGraph(schema_json) if fk_expansion is not None else None
 
         for table_name, table_def in schema_json["schema"].items():
             self.table_names.append(table_name)
@@ -69,49 +119,48 @@ class DenseSchemaFilter:
                 table_to_text(table_name, table_def)
             )
 
-        # Load embedding model (CPU-friendly)
-        self.model = SentenceTransformer(model_name)
-
-        # Embed schema ONCE
-        self.table_embeddings = self.model.encode(
-            self.table_texts,
-            normalize_embeddings=True,
-            show_progress_bar=False
-        )
+        # Load embedding model (CPU-friendly, shared across filters)
+        self.model = get_sentence_model(model_name)
+
+        # Embed schema ONCE (tables embedded in earlier runs or other variants come from disk)
+        if use_cache:
+            self.table_embeddings = get_embedding_cache().encode(
+                self.table_texts,
+                self.model,
+                f"{model_name}/normalized",
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+        else:
+            self.table_embeddings = self.model.encode(
+                self.table_texts,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
 
-    def filter(self, question: str, top_k: int = 5):
-        query_embedding = self.model.encode(
-            question,
-            normalize_embeddings=True
-        )
+    # pass a precomputed query_embedding (see encode_questions) to skip encoding
+    def filter(self, question: str, top_k: int = 5, query_embedding: np.ndarray = None):
+        if query_embedding is None:
+            query_embedding = self.model.encode(
+                question,
+                normalize_embeddings=True
+            )
 
         # cosine similarity via dot product (normalized vectors)
         scores = np.dot(self.table_embeddings, query_embedding)
 
-        ranked = sorted(
-            zip(self.table_names, scores),
-            key=lambda x: x[1],
-            reverse=True
-        )
+        return self._compress_schema(self._select(scores, top_k))
 
-        selected_tables = {
-            name for name, _ in ranked[:top_k]
-        }
-
-        return self._compress_schema(selected_tables)
+    # names of the top_k tables (ties keep schema order) + fk connecting tables
+    def _select(self, scores, top_k):
+        ranked = [self.table_names[i] for i in top_k_indices(scores, top_k)]
+        if self.fk_graph is not None:
+            ranked = self.fk_graph.connect(ranked, **self.fk_expansion)
+        return set(ranked)
 
     def _compress_schema(self, selected_tables):
-        compressed = deepcopy(self.schema_json)
-        compressed["schema"] = {
-            t: compressed["schema"][t]
-            for t in selected_tables
-        }
-
-        for table in compressed["schema"].values():
-            table["foreign_keys"] = [
-                fk for fk in table.get("foreign_keys", [])
-                if fk["sourceTable"] in selected_tables
-            ]
-
-        return compressed
+        return SchemaView(
+            self.schema_json,
+            [t for t in self.table_names if t in selected_tables]
+        )
 
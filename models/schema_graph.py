@@ -0,0 +1,99 @@
+from collections import deque
+
+
+class FKGraph:
+
+    """
+    Undirected foreign key adjacency of a schema, built once per schema
+    Connects a ranked table selection through the fewest extra tables
+    (greedy steiner forest approximation: per seed in rank order, shortest path to the nearest earlier component)
+    """
+
+    def __init__(self, schema_object: dict):
+        schema = schema_object["schema"]
+        order = {t: i for i, t in enumerate(schema)}
+
+        adjacency = {t: set() for t in schema}
+        for table, table_object in schema.items():
+            for fk in table_object.get("foreign_keys", []):
+                ref = fk["sourceTable"]
+                if ref in adjacency and ref != table:
+                    adjacency[table].add(ref)
+                    adjacency[ref].add(table)
+
+        # neighbors in schema order for deterministic paths
+        self.neighbors = {t: sorted(n, key=order.get) for t, n in adjacency.items()}
+
+    # tables reachable from start through selected tables only
+    def component(self, start: str, selected: set) -> set:
+        seen = {start}
+        queue = deque([start])
+        while queue:
+            t = queue.popleft()
+            for n in self.neighbors[t]:
+                if n in selected and n not in seen:
+                    seen.add(n)
+                    queue.append(n)
+        return seen
+
+    # unselected tables on the cheapest path from the tree to target, None if more than max_new are needed
+    # (0-1 bfs: passing a selected table is free, any other table costs one)
+    def connecting_path(self, tree: set, target: str, selected: set, max_new: int = 2) -> list:
+        dist = {t: 0 for t in tree}
+        parent = {}
+        queue = deque(tree)
+
+        while queue:
+            t = queue.popleft()
+            if t == target:
+                break
+            for n in self.neighbors[t]:
+                d = dist[t] + (0 if n in selected else 1)
+                if d > max_new or d >= dist.get(n, max_new + 1):
+                    continue
+                dist[n] = d
+                parent[n] = t
+                if n in selected:
+                    queue.appendleft(n)
+                else:
+                    queue.append(n)
+
+        if target not in dist:
+            return None
+
+        path = []
+        t = target
+        while t not in tree:
+            if t not in selected:
+                path.append(t)
+            t = parent[t]
+        return path[::-1]
+
+    # ranked tables + connecting tables, within an optional token budget for the added tables
+    # (a forest: seeds that cannot reach an earlier component within max_new start their own)
+    def connect(self, ranked: list, max_new: int = 2, token_budget: int = None, table_cost=None) -> list:
+        tables = list(ranked)
+        selected = set(ranked)
+        forest = set() # tables in the components of the seeds handled so far
+        spent = 0
+
+        for seed in ranked:
+            if seed in forest:
+                continue
+
+            # cheapest path to the nearest earlier component
+            path = self.connecting_path(forest, seed, selected, max_new=max_new) if forest else None
+
+            if path and token_budget is not None:
+                cost = sum(table_cost(t) for t in path)
+                if spent + cost > token_budget:
+                    path = None
+                else:
+                    spent += cost
+
+            if path:
+                tables.extend(path)
+                selected.update(path)
+            forest |= self.component(seed, selected)
+
+        return tables
\ No newline at end of file
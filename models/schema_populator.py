@@ -0,0 +1,189 @@
+import random
+import datetime
+from itertools import islice
+from dataclasses import dataclass
+
+STATUS_VALUES = ["active", "inactive", "pending", "archived", "deleted"]
+TYPE_VALUES = ["standard", "premium", "basic", "custom", "legacy"]
+TIMESTAMP_START = datetime.datetime(2015, 1, 1)
+TIMESTAMP_RANGE_SECONDS = 10 * 365 * 24 * 3600
+
+@dataclass
+class PopulateConfig:
+    # rows per synthetic table type
+    rows_entity: int = 1000
+    rows_join: int = 2000
+    rows_meta: int = 5000
+
+    batch_size: int = 10000 # rows per executemany
+    create_indexes: bool = False # index foreign key columns
+
+    # determinism
+    seed: int = 42
+
+class SchemaPopulator:
+
+    """
+    Fills synthetic tables of a scaled database with generated rows
+    Rows are streamed in batches, foreign keys only reference existing primary keys
+    Synthetic primary keys are 1..n, so references to them are drawn from that range
+    """
+
+    def __init__(self, conn, schema: dict, table_kinds: dict, cfg: PopulateConfig):
+        self.conn = conn
+        self.schema = schema # full scaled schema (original + synthetic tables)
+        self.table_kinds = table_kinds # synthetic table -> entity | join | meta
+        self.cfg = cfg
+        self.original_keys = {} # (table, column) -> existing values of original tables
+
+    # populate tables in fk order (entity before join and meta tables)
+    def populate(self, tables: list = None) -> dict:
+        tables = list(self.table_kinds) if tables is None else tables
+        order = {"entity": 0, "join": 1, "meta": 2}
+        tables = sorted(tables, key=lambda t: order[self.table_kinds[t]])
+
+        counts = {}
+        for table in tables:
+            counts[table] = self._populate_table(table)
+            if self.cfg.create_indexes:
+                self._create_fk_indexes(table)
+        return counts
+
+    def row_count(self, table: str) -> int:
+        kind = self.table_kinds[table]
+        if kind == "entity":
+            return self.cfg.rows_entity
+        if kind == "meta":
+            return self.cfg.rows_meta
+        return self.cfg.rows_join
+
+    def _populate_table(self, table: str) -> int:
+        columns = [c["name"] for c in self.schema[table]["columns"]]
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        params_sql = ", ".join("?" for _ in columns)
+        sql = f'INSERT INTO "{table}" ({col_sql}) VALUES ({params_sql})'
+
+        rows = self._iter_rows(table)
+        total = 0
+        while True:
+            batch = list(islice(rows, self.cfg.batch_size))
+            if not batch:
+                break
+            self.conn.executemany(sql, batch)
+            total += len(batch)
+        self.conn.commit()
+
+        return total
+
+    # generator of row tuples for a table
+    def _iter_rows(self, table: str):
+        table_obj = self.schema[table]
+        rng = random.Random(f"{self.cfg.seed}:{table}") # independent of table order
+        fks = {fk["targetColumn"]: fk for fk in table_obj.get("foreign_keys", [])}
+        pks = table_obj.get("primary_keys", [])
+
+        if self.table_kinds[table] == "join" and len(pks) == 2:
+            n_rows, pk_values = self._join_keys(table, pks, fks)
+        else:
+            n_rows, pk_values = self.row_count(table), None
+
+        generators = []
+        for col in table_obj["columns"]:
+            name = col["name"]
+            if pk_values is not None and name in pks:
+                pos = pks.index(name)
+                generators.append(lambda i, r, pos=pos: pk_values(i)[pos])
+            elif name in pks:
+                generators.append(lambda i, r: i + 1)
+            elif name in fks:
+                generators.append(self._fk_generator(fks[name]))
+            else:
+                generators.append(self._value_generator(table, name, col["type"]))
+
+        for i in range(n_rows):
+            yield tuple(gen(i, rng) for gen in generators)
+
+    # distinct (a, b) key pairs for composite join keys
+    def _join_keys(self, table: str, pks: list, fks: dict):
+        n_a = self._key_space(fks.get(pks[0]))
+        n_b = self._key_space(fks.get(pks[1]))
+        space = n_a * n_b
+        n_rows = min(self.row_count(table), space)
+
+        # stride coprime to the key space spreads rows over it without repeats
+        stride = 7919
+        while space > 1 and _gcd(stride, space) != 1:
+            stride += 2
+
+        def pk_values(i):
+            k = (i * stride) % space if space > 1 else i
+            return (k % n_a) + 1, (k // n_a) + 1
+
+        return n_rows, pk_values
+
+    def _key_space(self, fk: dict) -> int:
+        if fk and fk["sourceTable"] in self.table_kinds:
+            return self.row_count(fk["sourceTable"])
+        return self.cfg.rows_entity
+
+    # draws referenced keys: 1..n for synthetic tables, existing values for original ones
+    def _fk_generator(self, fk: dict):
+        ref_table = fk["sourceTable"]
+        ref_col = fk["sourceColumn"]
+
+        if ref_table in self.table_kinds:
+            n = self.row_count(ref_table)
+            return lambda i, r: r.randint(1, n) if n else None
+
+        values = self._original_keys(ref_table, ref_col)
+        return lambda i, r: r.choice(values) if values else None
+
+    def _original_keys(self, table: str, column: str) -> list:
+        key = (table, column)
+        if key not in self.original_keys:
+            cur = self.conn.execute(f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL')
+            self.original_keys[key] = [row[0] for row in cur.fetchall()]
+        return self.original_keys[key]
+
+    # value generator for the attribute templates of the scaler, falls back to the column type
+    def _value_generator(self, table: str, name: str, sql_type: str):
+        sql_type = (sql_type or "").upper()
+
+        if name == "name":
+            return lambda i, r: f"{table} {i + 1}"
+        if name in ("description", "content"):
+            return lambda i, r: f"{name} of {table} {i + 1}"
+        if name == "status":
+            return lambda i, r: r.choice(STATUS_VALUES)
+        if name == "type":
+            return lambda i, r: r.choice(TYPE_VALUES)
+        if name == "year":
+            return lambda i, r: r.randint(1990, 2025)
+        if name == "flag":
+            return lambda i, r: r.randint(0, 1)
+        if name == "key":
+            return lambda i, r: f"key_{r.randint(1, 100)}"
+        if name == "value":
+            return lambda i, r: f"value_{r.randint(1, 10000)}"
+
+        if sql_type in ("TIMESTAMP", "DATE", "DATETIME"):
+            return lambda i, r: (
+                TIMESTAMP_START + datetime.timedelta(seconds=r.randrange(TIMESTAMP_RANGE_SECONDS))
+            ).isoformat(sep=" ")
+        if "INT" in sql_type:
+            return lambda i, r: r.randint(0, 1000)
+        if sql_type in ("REAL", "FLOAT", "DOUBLE", "NUMERIC"):
+            return lambda i, r: round(r.uniform(0, 1000), 2)
+        return lambda i, r: f"{name}_{r.randint(1, 10000)}"
+
+    def _create_fk_indexes(self, table: str) -> None:
+        for fk in self.schema[table].get("foreign_keys", []):
+            col = fk["targetColumn"]
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{col}" ON "{table}" ("{col}")')
+        self.conn.commit()
+
+
+def _gcd(a: int, b: int) -> int:
+    while b:
+        a, b = b, a % b
+    return a
@@ -0,0 +1,236 @@
+import random
+from collections import Counter
+
+from utils.tokens import count_tokens
+
+SCHEMA_FORMATS = ["default", "compact", "ddl", "inline_fk", "folded"]
+
+class SchemaRenderer:
+
+    """
+    Renders schema strings from pre-rendered per-table fragments
+    Fragments and foreign key lines are built once per table and format and cached
+    Any subset or ordering of tables is a join over cached fragments
+    """
+
+    # renderers of loaded schema variants, keyed by (schemas_dir, db_id)
+    _variants = {}
+
+    def __init__(self, schema_object: dict):
+        self.schema_object = schema_object
+        self.db_id = schema_object["db_id"]
+
+        # (format, table) -> (prefix, items, separator, suffix, fk lines)
+        # items and fk lines are (referenced table, text, text if the reference is excluded)
+        self.fragments = {}
+        self.table_token_counts = {} # (format, table) -> prompt tokens of the table alone
+
+    # shared renderer of a schema variant (loaded once per process)
+    @classmethod
+    def for_variant(cls, key: tuple, load_schema_object) -> "SchemaRenderer":
+        renderer = cls._variants.get(key)
+        if renderer is None:
+            renderer = cls(load_schema_object())
+            cls._variants[key] = renderer
+        return renderer
+
+    def fragment(self, table: str, schema_format: str = "default") -> tuple:
+        key = (schema_format, table)
+        frag = self.fragments.get(key)
+        if frag is None:
+            if schema_format not in SCHEMA_FORMATS:
+                raise ValueError(f"Unknown schema format [{schema_format}]")
+            table_object = self.schema_object["schema"][table]
+            frag = getattr(self, f"_render_{schema_format}")(table, table_object)
+            self.fragments[key] = frag
+        return frag
+
+    # (col: TYPE, PRIMARY KEY, NOT NULL), blocks + separate foreign key section
+    def _render_default(self, table: str, table_object: dict) -> tuple:
+        lines = [f"# Table: {table}\n[\n"]
+        for column_object in table_object["columns"]:
+            line = f"({column_object['name']}: {column_object['type'].upper()},"
+            if column_object['pk'] == 1:
+                line += " PRIMARY KEY,"
+            if not column_object['notnull']:
+                line += " NOT NULL"
+            lines.append(line + "),\n")
+        lines.append("]\n\n")
+
+        fk_lines = [
+            (fk["sourceTable"], f"{table}.{fk['targetColumn']} REFERENCES {fk['sourceTable']}.{fk['sourceColumn']}\n", None)
+            for fk in table_object.get("foreign_keys", [])
+        ]
+        return "".join(lines), [], "", "", fk_lines
+
+    # table(col TYPE PK, ...) lines + terse foreign key section
+    def _render_compact(self, table: str, table_object: dict) -> tuple:
+        items = [(None, _column_text(c), None) for c in table_object["columns"]]
+        fk_lines = [
+            (fk["sourceTable"], f"{table}.{fk['targetColumn']} -> {fk['sourceTable']}.{fk['sourceColumn']}\n", None)
+            for fk in table_object.get("foreign_keys", [])
+        ]
+        return f"{table}(", items, ", ", ")\n", fk_lines
+
+    # table(col TYPE PK, col TYPE -> other.col, ...) lines, no foreign key section
+    def _render_inline_fk(self, table: str, table_object: dict) -> tuple:
+        refs = {}
+        for fk in table_object.get("foreign_keys", []):
+            refs.setdefault(fk["targetColumn"], fk)
+
+        items = []
+        for c in table_object["columns"]:
+            text = _column_text(c)
+            fk = refs.get(c["name"])
+            if fk:
+                items.append((fk["sourceTable"], f"{text} -> {fk['sourceTable']}.{fk['sourceColumn']}", text))
+            else:
+                items.append((None, text, None))
+        return f"{table}(", items, ", ", ")\n", []
+
+    # inline_fk split into key columns and the trailing attribute columns,
+    # which are folded into a shared column list when several tables repeat them
+    def _render_folded(self, table: str, table_object: dict) -> tuple:
+        _, items, _, _, _ = self._render_inline_fk(table, table_object)
+
+        keys = set(table_object.get("primary_keys", []))
+        keys.update(fk["targetColumn"] for fk in table_object.get("foreign_keys", []))
+        split = 0
+        for i, c in enumerate(table_object["columns"]):
+            if c["pk"] > 0 or c["name"] in keys:
+                split = i + 1
+
+        tail = items[split:]
+        if len(tail) < 2:
+            return f"{table}(", items, None
+        return f"{table}(", items[:split], ", ".join(text for _, text, _ in tail)
+
+    # CREATE TABLE statements with key constraints
+    def _render_ddl(self, table: str, table_object: dict) -> tuple:
+        pks = table_object.get("primary_keys", [])
+        inline_pk = pks[0] if len(pks) == 1 else None
+
+        items = []
+        for c in table_object["columns"]:
+            text = f"{_quote(c['name'])} {c['type'].upper()}"
+            if c["notnull"]:
+                text += " NOT NULL"
+            if c["name"] == inline_pk:
+                text += " PRIMARY KEY"
+            items.append((None, text, None))
+
+        if len(pks) > 1:
+            items.append((None, f"PRIMARY KEY ({', '.join(_quote(k) for k in pks)})", None))
+
+        for fk in table_object.get("foreign_keys", []):
+            items.append((
+                fk["sourceTable"],
+                f"FOREIGN KEY ({_quote(fk['targetColumn'])}) REFERENCES {_quote(fk['sourceTable'])}({_quote(fk['sourceColumn'])})",
+                None
+            ))
+        return f"CREATE TABLE {_quote(table)} (\n  ", items, ",\n  ", "\n);\n", []
+
+    # schema string of all (or the given) tables
+    # with a table subset only foreign keys between included tables are listed
+    def render(self, tables: list = None, randomize_table_order: bool = False, schema_format: str = "default") -> str:
+        subset = tables is not None
+        tables = list(self.schema_object["schema"].keys() if tables is None else tables)
+        if randomize_table_order:
+            random.shuffle(tables)
+
+        included = set(tables)
+
+        def keep(ref, text, fallback):
+            if ref is None or not subset or ref in included:
+                return text
+            return fallback
+
+        if schema_format == "folded":
+            return self._fold(tables, keep)
+
+        parts = [HEADERS[schema_format].format(db_id=self.db_id)]
+        fk_lines = []
+        for t in tables:
+            prefix, items, sep, suffix, fks = self.fragment(t, schema_format)
+            if items:
+                texts = [keep(*item) for item in items]
+                parts.append(prefix + sep.join(text for text in texts if text is not None) + suffix)
+            else:
+                parts.append(prefix)
+            if subset:
+                fk_lines.extend(line for line in (keep(*fk) for fk in fks) if line is not None)
+            else:
+                fk_lines.extend(text for _, text, _ in fks)
+
+        if fk_lines:
+            parts.append(FK_HEADERS[schema_format])
+            parts.extend(fk_lines)
+
+        return "".join(parts)
+
+    # table lines referencing column lists shared by several of the rendered tables
+    def _fold(self, tables: list, keep) -> str:
+        fragments = [self.fragment(t, "folded") for t in tables]
+        counts = Counter(tail for _, _, tail in fragments if tail)
+
+        shared = {} # column list -> name, numbered by first use
+        lines = []
+        for prefix, items, tail in fragments:
+            texts = [text for text in (keep(*item) for item in items) if text is not None]
+            if tail and counts[tail] > 1:
+                if tail not in shared:
+                    shared[tail] = f"@{len(shared) + 1}"
+                texts.append(shared[tail])
+            elif tail:
+                texts.append(tail)
+            lines.append(f"{prefix}{', '.join(texts)})\n")
+
+        parts = [HEADERS["folded"].format(db_id=self.db_id)]
+        if shared:
+            parts.append("# Shared column lists (@n in a table stands for its columns)\n")
+            parts.extend(f"{name} = {tail}\n" for tail, name in shared.items())
+            parts.append("# Tables\n")
+        parts.extend(lines)
+
+        return "".join(parts)
+
+    # prompt tokens of one table block in a format (cost of adding it to a subset)
+    def table_tokens(self, table: str, schema_format: str = "default") -> int:
+        key = (schema_format, table)
+        if key not in self.table_token_counts:
+            text = self.render(tables=[table], schema_format=schema_format)
+            header = HEADERS[schema_format].format(db_id=self.db_id)
+            self.table_token_counts[key] = count_tokens(text[len(header):])
+        return self.table_token_counts[key]
+
+    # prompt tokens of the rendered schema per format
+    def token_counts(self, tables: list = None, formats: list = SCHEMA_FORMATS) -> dict:
+        return {
+            schema_format: count_tokens(self.render(tables=tables, schema_format=schema_format))
+            for schema_format in formats
+        }
+
+
+HEADERS = {
+    "default": "## Database Name: {db_id} \n\n## Database Schema \n\n",
+    "compact": "# Database: {db_id}\n",
+    "inline_fk": "# Database: {db_id}\n",
+    "folded": "# Database: {db_id}\n",
+    "ddl": "-- Database: {db_id}\n",
+}
+
+FK_HEADERS = {
+    "default": "## Foreign Keys \n",
+    "compact": "# Foreign keys\n",
+}
+
+def _column_text(column_object: dict) -> str:
+    text = f"{column_object['name']} {column_object['type'].upper()}"
+    if column_object['pk'] > 0:
+        text += " PK"
+    elif column_object['notnull']:
+        text += " NOT NULL"
+    return text
+
+def _quote(name: str) -> str:
+    return name if name.isidentifier() else f'"{name}"'
\ No newline at end of file
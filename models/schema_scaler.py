@@ -1,13 +1,18 @@
 import os
 import copy
 import json
+import math
 import shutil
+import hashlib
 import random
 import sqlite3
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
 from configs.paths import DATASETS_PATH, SCHEMAS_PATH, CANDIDATE_PATH, SPIDER_DATABASE_PATH, METADATA_PATH
-from utils.schema import get_original_column_names, make_column, sqlite_create_table_sql
+from utils.schema import get_original_column_names, make_column, sqlite_create_table_sql, make_schema_delta
+from utils.sqlite import mark_overlay, connect as connect_sqlite
+from models.schema_populator import SchemaPopulator, PopulateConfig
+from models.schema_catalog import save_schema
 
 ENTITY_ATTR_TEMPLATES = [
     ("name", "TEXT"),
@@ -52,8 +57,22 @@ class ScaleConfig:
     entity_fk_prob: float = 0.30 # chance an entity table gets an fk at all
     meta_fk_prob: float = 0.10
 
+    # draw join pairs lazily instead of shuffling all entity pairs (linear time,
+    # but a different rng stream than the published variants)
+    lazy_join_pairs: bool = False
+
+    # build scaled sqlite files in memory and write them once
+    sqlite_in_memory: bool = False
+    # scaled sqlite files hold only synthetic tables, the original is attached on open
+    sqlite_overlay: bool = False
+    # store scaled schemas in the variant catalog instead of one json file per database
+    schema_catalog: bool = False
+    # store only the synthetic tables + hash of the original schema
+    schema_delta: bool = False
+
     # determinism
     seed: int = 42
+    derive_db_seed: bool = False # per-database seed from seed + db_id
 
 class SchemaScaler:
 
@@ -67,7 +86,8 @@ class SchemaScaler:
         self.schema_original = schema_json["schema"]
         self.schema_new = copy.deepcopy(self.schema_original) # start with original schema
         self.cfg = cfg
-        self.rng = random.Random(cfg.seed)
+        self.seed = derive_seed(cfg.seed, self.db_id) if cfg.derive_db_seed else cfg.seed
+        self.rng = random.Random(self.seed)
 
         with open(f"{CANDIDATE_PATH}{self.dataset}/{self.db_id}.json", "r") as f:
             self.candidate_words = json.load(f)
@@ -87,7 +107,21 @@ class SchemaScaler:
         # track concept families
         self.entity_families = {}  # base_word -> [table_names]
 
-        # scaled data paths
+        # tables generated so far (a sweep extends them to larger targets)
+        self.n_entity_created = 0
+        self.n_join_created = 0
+        self.n_meta_created = 0
+        self.bridges_created = False
+
+        # last sqlite variant built by this scaler and its synthetic tables
+        self.last_sqlite_db = None
+        self.last_sqlite_tables = set()
+        self.last_sqlite_new_tables = [] # created by the last build, not yet populated
+
+        self._init_paths()
+
+    # scaled data paths
+    def _init_paths(self):
         if self.cfg.apply_family_generation:
             self.scaled_schemas_path = f"{SCHEMAS_PATH}{self.dataset}_{self.cfg.target_total_tables}_f"
             self.scaled_sqlite_path = f"{DATASETS_PATH}{self.dataset}_{self.cfg.target_total_tables}_f/database/"
@@ -100,7 +134,6 @@ class SchemaScaler:
         os.makedirs(self.scaled_sqlite_path, exist_ok=True)
         os.makedirs(self.meta_dir, exist_ok=True)
 
-    
     # get next candidate word that doesn't collide with original table names
     def _pop_fresh_word(self):
         while self.candidate_words:
@@ -300,6 +333,21 @@ class SchemaScaler:
 
         self.entity_tables.append(bridge_name)
 
+    # yields distinct entity pairs in random order without materializing all of them
+    # (lazy fisher-yates over pair ranks, memory grows only with pairs drawn)
+    def _sample_entity_pairs(self, ents_sorted: list):
+        n = len(ents_sorted)
+        total = n * (n - 1) // 2
+        swapped = {}
+
+        for pos in range(total):
+            pick = self.rng.randrange(pos, total)
+            rank = swapped.get(pick, pick)
+            swapped[pick] = swapped.pop(pos, pos)
+
+            i, j = _unrank_pair(rank, n)
+            yield ents_sorted[i], ents_sorted[j]
+
     # main enlarger
     def enlarge(self) -> dict:
         # compute how many new tables to add
@@ -311,7 +359,7 @@ class SchemaScaler:
         n_meta = n_new - n_entity - n_join  # absorb rounding
 
         # generate entity tables
-        for _ in range(n_entity):
+        for _ in range(max(0, n_entity - self.n_entity_created)):
             w = self._pop_fresh_word()
 
             if self.cfg.apply_family_generation and self.rng.random() < self.cfg.orig_prob:
@@ -320,9 +368,11 @@ class SchemaScaler:
                 self._make_entity_table(table_name, base_original=base)
             else:
                 self._make_entity_table(w)
+            self.n_entity_created += 1
 
         # only for level 2 make join bridge tables
-        if self.cfg.apply_join_competition:
+        if self.cfg.apply_join_competition and not self.bridges_created:
+            self.bridges_created = True
             for src in sorted(self.schema_original.keys()):
                 for fk in self.schema_original[src].get("foreign_keys", []):
                     tgt = fk["sourceTable"]
@@ -332,27 +382,30 @@ class SchemaScaler:
                     self._make_join_bridge(src, tgt, src_pk, tgt_pk)
             
         # generate join tables from entity pairs deterministically
-        pairs = []
         ents_sorted = sorted(self.entity_tables)
-        for i in range(len(ents_sorted)):
-            for j in range(i + 1, len(ents_sorted)):
-                pairs.append((ents_sorted[i], ents_sorted[j]))        
-        self.rng.shuffle(pairs) # deterministically shuffle to diversify while remaining reproducible
+        if self.cfg.lazy_join_pairs:
+            pairs = self._sample_entity_pairs(ents_sorted)
+        else:
+            pairs = []
+            for i in range(len(ents_sorted)):
+                for j in range(i + 1, len(ents_sorted)):
+                    pairs.append((ents_sorted[i], ents_sorted[j]))        
+            self.rng.shuffle(pairs) # deterministically shuffle to diversify while remaining reproducible
 
-        created = 0
         for (a, b) in pairs:
-            if created >= n_join:
+            if self.n_join_created >= n_join:
                 break
             before = len(self.schema_new)
             self._make_join_table(a, b)
             after = len(self.schema_new)
             if after > before:
-                created += 1
+                self.n_join_created += 1
 
         # generate metadata tables
-        for _ in range(n_meta):
+        for _ in range(max(0, n_meta - self.n_meta_created)):
             w = self._pop_fresh_word()
             self._make_meta_table(w)
+            self.n_meta_created += 1
 
         # store new schema object
         schema = {
@@ -360,15 +413,25 @@ class SchemaScaler:
             "db_id": self.db_id,
             "schema": self.schema_new
         }
-        with open(
-            f"{self.scaled_schemas_path}/{self.db_id}.json",
-            "w",
-            encoding="utf-8",
-        ) as f:
-            json.dump(schema, f, indent=4)
+        stored = schema
+        if self.cfg.schema_delta:
+            stored = make_schema_delta(schema, self.schema_original, base_dataset=self.dataset)
+
+        save_schema(self.scaled_schemas_path, stored, use_catalog=self.cfg.schema_catalog)
 
         return schema
 
+    # continue scaling to a larger target, all tables generated so far are kept
+    # (same rng stream, so every larger variant is a superset of the smaller one)
+    def extend_to(self, target_total_tables: int) -> dict:
+        if target_total_tables < self.cfg.target_total_tables:
+            raise ValueError("Sweep sizes must be increasing.")
+
+        self.cfg = replace(self.cfg, target_total_tables=target_total_tables)
+        self._init_paths()
+
+        return self.enlarge()
+
     # create new sqlite databases
     def create_new_sqlite_db(self) -> None:
         target_dir = f"{self.scaled_sqlite_path}{self.db_id}/"
@@ -378,33 +441,104 @@ class SchemaScaler:
         src_db = f"{self.db_path_original}{self.db_id}/{self.db_id}.sqlite"
         dst_db = f"{target_dir}{self.db_id}.sqlite"
 
+        # extend the previous (smaller) variant of a sweep instead of starting over
+        if self.last_sqlite_db and self.last_sqlite_db != dst_db and os.path.exists(self.last_sqlite_db):
+            src_db = self.last_sqlite_db
+        else:
+            self.last_sqlite_tables = set()
+            if self.cfg.sqlite_overlay:
+                src_db = None # synthetic tables only, original is attached when opened
+
         if os.path.exists(dst_db):
             os.remove(dst_db)
-            
-        shutil.copy2(src_db, dst_db)
-
-        conn = sqlite3.connect(dst_db)
-        cur = conn.cursor()
-        cur.execute("PRAGMA foreign_keys = ON;")
 
         original_tables = set(self.schema_original.keys())
         new_tables = [
             t for t in self.schema_new.keys()
-            if t not in original_tables
+            if t not in original_tables and t not in self.last_sqlite_tables
         ]
 
-        # create tables
-        for table in new_tables:
-            try:
-                sql = sqlite_create_table_sql(table, self.schema_new[table])
-                cur.execute(sql)
-            except Exception as e:
-                print(f"Error in Sqlite Creation on {self.dataset}/{self.db_id}")
-                print(f"Concerning table {table}")
-                raise Exception(e)
+        # all tables as one ddl script, applied in a single transaction
+        script = "\n".join(
+            sqlite_create_table_sql(table, self.schema_new[table])
+            for table in new_tables
+        )
+
+        if self.cfg.sqlite_in_memory:
+            # build in memory and flush to disk once
+            conn = sqlite3.connect(":memory:")
+            if src_db:
+                src = sqlite3.connect(src_db)
+                src.backup(conn)
+                src.close()
+        else:
+            if src_db:
+                shutil.copy2(src_db, dst_db)
+            conn = sqlite3.connect(dst_db)
+            # fresh copy, nothing to recover on failure
+            conn.execute("PRAGMA journal_mode = OFF;")
+            conn.execute("PRAGMA synchronous = OFF;")
+
+        if self.cfg.sqlite_overlay:
+            mark_overlay(conn)
+
+        try:
+            conn.executescript(f"BEGIN;\n{script}\nCOMMIT;")
+
+            if self.cfg.sqlite_in_memory:
+                dst = sqlite3.connect(dst_db)
+                conn.backup(dst)
+                dst.close()
+        except sqlite3.Error as e:
+            print(f"Error in Sqlite Creation on {self.dataset}/{self.db_id}")
+            raise Exception(e)
+        finally:
+            conn.close()
+
+        self.last_sqlite_db = dst_db
+        self.last_sqlite_tables.update(new_tables)
+        self.last_sqlite_new_tables = new_tables
+
+    # synthetic table -> entity | join | meta (bridges count as entities)
+    def table_kinds(self) -> dict:
+        entity_tables = set(self.entity_tables)
+        meta_tables = set(self.meta_tables)
+
+        kinds = {}
+        for t in self.schema_new:
+            if t in self.schema_original:
+                continue
+            if t in entity_tables:
+                kinds[t] = "entity"
+            elif t in meta_tables:
+                kinds[t] = "meta"
+            else:
+                kinds[t] = "join"
+        return kinds
+
+    # fill the tables of the last built sqlite variant with synthetic rows
+    # (a sweep variant copies the rows of the previous one, only new tables are filled)
+    def populate_sqlite_db(self, pop_cfg: PopulateConfig) -> dict:
+        if not self.last_sqlite_db:
+            raise RuntimeError("Run create_new_sqlite_db first")
 
-        conn.commit()
-        conn.close()
+        src_db = f"{self.db_path_original}{self.db_id}/{self.db_id}.sqlite"
+        conn = connect_sqlite(self.last_sqlite_db, src_db)
+        # fresh variant, nothing to recover on failure
+        conn.execute("PRAGMA journal_mode = OFF;")
+        conn.execute("PRAGMA synchronous = OFF;")
+
+        try:
+            populator = SchemaPopulator(conn, self.schema_new, self.table_kinds(), pop_cfg)
+            counts = populator.populate(self.last_sqlite_new_tables)
+        except sqlite3.Error as e:
+            print(f"Error in Sqlite Population on {self.dataset}/{self.db_id}")
+            raise Exception(e)
+        finally:
+            conn.close()
+
+        self.last_sqlite_new_tables = []
+        return counts
 
     # samples subset of original table columns (always with pk)
     def _sample_original_columns(self, base_table: str, reuse_ratio: float = 0.6):
@@ -453,7 +587,7 @@ class SchemaScaler:
             "dataset": self.dataset,
             "db_id": self.db_id,
             "target_total_tables": self.cfg.target_total_tables,
-            "seed": self.cfg.seed,
+            "seed": self.seed,
             "ratios": {
                 "entity": self.cfg.ratio_entity,
                 "join": self.cfg.ratio_join,
@@ -474,4 +608,16 @@ class SchemaScaler:
 
         out_path = f"{self.meta_dir}/{self.db_id}.json"
         with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(meta, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+
+
+# k-th pair (i, j) with i < j of n items in row-major order
+def _unrank_pair(k: int, n: int) -> tuple:
+    i = n - 2 - (math.isqrt(4 * n * (n - 1) - 8 * k - 7) - 1) // 2
+    j = k + i + 1 - n * (n - 1) // 2 + (n - i) * (n - i - 1) // 2
+    return i, j
+
+# stable per-database seed (independent of scheduling and set iteration order)
+def derive_seed(seed: int, db_id: str) -> int:
+    digest = hashlib.sha256(f"{seed}:{db_id}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
\ No newline at end of file
@@ -1,21 +1,60 @@
 import os
+import argparse
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
 
 from models.schema_builder import SchemaBuilder
-from configs.paths import SPIDER_DATABASE_PATH
+from configs.paths import SPIDER_DATABASE_PATH, DATASETS_PATH
 
 """
     creates schema representation in json via
     SchemaBuilder and stores files in configs.paths.SCHEMA_PATHS
+    (scaled variants in configs.paths.INTROSPECTED_SCHEMAS_PATH)
+    databases whose sqlite file did not change since the last run are skipped
 
 """
 
-SPIDER_DATASETS = os.listdir(SPIDER_DATABASE_PATH)
+# introspect one database, returns True if its schema was (re)built
+def prepare_schema(db: str, db_size: str, apply_level_2: bool, use_catalog: bool, force: bool) -> bool:
+    sb = SchemaBuilder(dataset="spider", db_id=db, db_size=db_size, applyChallenges=apply_level_2)
+    if not force and sb.is_up_to_date():
+        return False
 
-print("Starting schema generation for spider.")
-for db in tqdm(SPIDER_DATASETS):
-    with SchemaBuilder(dataset="spider", db_id=db) as sb:
+    with sb:
         sb.build_schema_object()
-        sb.save_schema_json()
+        sb.save_schema_json(use_catalog=use_catalog, verbose=False)
+    return True
 
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db_size", type=str, default="0") # 0 = original databases, else a scaled variant
+    parser.add_argument("--apply_level_2", action="store_false")
+    parser.add_argument("--schema_catalog", action="store_true") # one schema catalog instead of json files
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--force", action="store_true") # rebuild unchanged databases too
+    args = parser.parse_args()
+
+    if args.db_size == "0":
+        database_dir = SPIDER_DATABASE_PATH
+    elif args.apply_level_2:
+        database_dir = f"{DATASETS_PATH}spider_{args.db_size}_f/database/"
+    else:
+        database_dir = f"{DATASETS_PATH}spider_{args.db_size}/database/"
+
+    SPIDER_DATASETS = sorted(os.listdir(database_dir))
+    job_args = [
+        [args.db_size] * len(SPIDER_DATASETS),
+        [args.apply_level_2] * len(SPIDER_DATASETS),
+        [args.schema_catalog] * len(SPIDER_DATASETS),
+        [args.force] * len(SPIDER_DATASETS),
+    ]
+
+    print(f"Starting schema generation for {database_dir}.")
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            built = list(tqdm(executor.map(prepare_schema, SPIDER_DATASETS, *job_args), total=len(SPIDER_DATASETS)))
+    else:
+        built = [prepare_schema(*db_args) for db_args in tqdm(list(zip(SPIDER_DATASETS, *job_args)))]
+
+    print(f"✅ {sum(built)} schemas built, {len(built) - sum(built)} up to date.")
\ No newline at end of file
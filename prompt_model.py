@@ -7,7 +7,9 @@ from dotenv import load_dotenv
 
 from models.prompt import Prompter
 from models.schema_builder import SchemaBuilder
-from models.schema_filter import BM25SchemaFilter, DenseSchemaFilter
+from models.schema_filter import BM25SchemaFilter, DenseSchemaFilter, encode_questions, get_sentence_model
+from models.schema_renderer import SCHEMA_FORMATS
+from utils.tokens import count_tokens
 from configs.paths import SPIDER_DEV_PATH, RESULTS_PATH
 
 load_dotenv()
@@ -25,12 +27,20 @@ if __name__ == '__main__':
     parser.add_argument("--db_size", type=str, default="100")
     parser.add_argument("--apply_level_2", action="store_false")
     parser.add_argument("--schema_filter", type=str, choices=["bm25", "dense"], default=None)
+    parser.add_argument("--schema_format", type=str, choices=SCHEMA_FORMATS, default="default")
+    parser.add_argument("--fk_expand", action="store_true") # add tables connecting the top_k tables via foreign keys
+    parser.add_argument("--fk_max_new", type=int, default=2) # max connecting tables per top_k table
+    parser.add_argument("--fk_token_budget", type=int, default=None) # max prompt tokens of all connecting tables
     args = parser.parse_args()
 
     MODEL = args.model
     DB_SIZE = args.db_size
     F_SUFFIX = args.apply_level_2
     SCHEMA_FILTER = args.schema_filter    
+    SCHEMA_FORMAT = args.schema_format
+    FORMAT_SUFFIX = "" if SCHEMA_FORMAT == "default" else f"_{SCHEMA_FORMAT}"
+    FK_EXPAND = args.fk_expand and SCHEMA_FILTER is not None
+    FILTER_NAME = f"{SCHEMA_FILTER}_fk" if FK_EXPAND else SCHEMA_FILTER
 
     os.makedirs(RESULTS_PATH, exist_ok=True)
 
@@ -41,23 +51,24 @@ if __name__ == '__main__':
     schema_strings = {} # stores schema strings per db_id
     schema_dicts = {} # stores schema objects per db_id
     schema_filters = {} # stores schema filter objects per db_id
+    schema_renderers = {} # stores fragment cached schema renderers per db_id
 
     responses = []
 
     if F_SUFFIX:
         if SCHEMA_FILTER:
-            json_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_f_{MODEL}_{SCHEMA_FILTER}_results.json"
-            jsonl_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_f_{MODEL}_{SCHEMA_FILTER}_results.jsonl"
+            json_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_f_{MODEL}_{FILTER_NAME}{FORMAT_SUFFIX}_results.json"
+            jsonl_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_f_{MODEL}_{FILTER_NAME}{FORMAT_SUFFIX}_results.jsonl"
         else:
-            json_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_f_{MODEL}_results.json"
-            jsonl_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_f_{MODEL}_results.jsonl"
+            json_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_f_{MODEL}{FORMAT_SUFFIX}_results.json"
+            jsonl_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_f_{MODEL}{FORMAT_SUFFIX}_results.jsonl"
     else:
         if SCHEMA_FILTER:
-            json_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_{MODEL}_{SCHEMA_FILTER}_results.json"
-            jsonl_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_{MODEL}_{SCHEMA_FILTER}_results.jsonl"
+            json_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_{MODEL}_{FILTER_NAME}{FORMAT_SUFFIX}_results.json"
+            jsonl_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_{MODEL}_{FILTER_NAME}{FORMAT_SUFFIX}_results.jsonl"
         else:
-            json_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_{MODEL}_results.json"
-            jsonl_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_{MODEL}_results.jsonl"
+            json_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_{MODEL}{FORMAT_SUFFIX}_results.json"
+            jsonl_path = f"{RESULTS_PATH}{DATASET}_{DB_SIZE}_{MODEL}{FORMAT_SUFFIX}_results.jsonl"
 
     # json as main results file
     
@@ -82,6 +93,26 @@ if __name__ == '__main__':
     start_index = len(responses)
     print(f"Starting generating responses at index {start_index}")
 
+    # encode the remaining questions ahead of time in batches per db_id,
+    # the batch time is shared equally by the questions of the batch
+    # (model loaded before timing, questions encoded without the embedding cache
+    # so filter_duration_seconds stays comparable across reruns)
+    question_embeddings = {}
+    encode_seconds = {}
+    if SCHEMA_FILTER == "dense":
+        get_sentence_model("all-MiniLM-L6-v2")
+        by_db = {}
+        for i in range(start_index, len(samples)):
+            by_db.setdefault(samples[i]["db_id"], []).append(i)
+
+        for db_id, indices in by_db.items():
+            start_time = time.perf_counter()
+            embeddings = encode_questions([samples[i]["question"] for i in indices], use_cache=False)
+            amortized = (time.perf_counter() - start_time) / len(indices)
+            for i, embedding in zip(indices, embeddings):
+                question_embeddings[i] = embedding
+                encode_seconds[i] = amortized
+
     for i, sample in tqdm(enumerate(samples[start_index:], start=start_index)):
 
         db_id = sample["db_id"]
@@ -90,25 +121,42 @@ if __name__ == '__main__':
             sb = SchemaBuilder(dataset=DATASET, db_id=db_id, db_size=DB_SIZE, applyChallenges=F_SUFFIX)
             sb.load_schema_json(repopulate_attributes=True)
             schema_dicts[db_id] = sb.schema_object
-            schema_strings[db_id] = sb.generate_schema_string(randomize_table_order=True)
+            schema_renderers[db_id] = sb.renderer
+            schema_strings[db_id] = sb.generate_schema_string(randomize_table_order=True, schema_format=SCHEMA_FORMAT)
         
         if SCHEMA_FILTER:
             if db_id not in schema_filters:
+                fk_expansion = None
+                if FK_EXPAND:
+                    renderer = schema_renderers[db_id]
+                    fk_expansion = {
+                        "max_new": args.fk_max_new,
+                        "token_budget": args.fk_token_budget,
+                        "table_cost": lambda t, r=renderer: r.table_tokens(t, SCHEMA_FORMAT)
+                    }
+
                 if SCHEMA_FILTER == "bm25":
-                    schema_filters[db_id] = BM25SchemaFilter(schema_json=schema_dicts[db_id])
+                    schema_filters[db_id] = BM25SchemaFilter(schema_json=schema_dicts[db_id], fk_expansion=fk_expansion)
                 elif SCHEMA_FILTER == "dense":
-                    schema_filters[db_id] = DenseSchemaFilter(schema_json=schema_dicts[db_id])
+                    schema_filters[db_id] = DenseSchemaFilter(schema_json=schema_dicts[db_id], fk_expansion=fk_expansion)
                 else:
                     raise ValueError("Invalid Schema Filter!")
             
             start_time = time.perf_counter() # start timer
-            compressed_schema = schema_filters[db_id].filter(question=sample["question"], top_k=10)
+            if i in question_embeddings:
+                compressed_schema = schema_filters[db_id].filter(
+                    question=sample["question"], top_k=10, query_embedding=question_embeddings[i]
+                )
+            else:
+                compressed_schema = schema_filters[db_id].filter(question=sample["question"], top_k=10)
             end_time = time.perf_counter()  # end timer
-            filter_duration_seconds = end_time - start_time
+            filter_duration_seconds = end_time - start_time + encode_seconds.get(i, 0)
 
-            compressed_sb = SchemaBuilder.load_schema_dict(compressed_schema)
-            schema_string = compressed_sb.generate_schema_string(randomize_table_order=True)
-            tables_included = list(compressed_sb.schema_object["schema"].keys())
+            # subset rendered from the cached table fragments of the full schema
+            tables_included = list(compressed_schema["schema"].keys())
+            schema_string = schema_renderers[db_id].render(
+                tables=tables_included, randomize_table_order=True, schema_format=SCHEMA_FORMAT
+            )
             
         else:
             schema_string = schema_strings[db_id]
@@ -126,6 +174,8 @@ if __name__ == '__main__':
         response["db_id"] = db_id
         response["filter_duration_seconds"] = filter_duration_seconds
         response["tables_included"] = tables_included # only for filtered schemas (otherwise None)
+        response["schema_format"] = SCHEMA_FORMAT
+        response["schema_tokens"] = count_tokens(schema_string)
         response["index"] = i
 
         responses.append(response)
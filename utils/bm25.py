@@ -0,0 +1,66 @@
+import math
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class SparseBM25:
+
+    """
+    BM25 (Okapi, same scoring as rank_bm25.BM25Okapi) over a sparse document-term matrix
+    Term weights (idf + length norm) are precomputed, scoring is one sparse product
+    Many queries are scored at once by stacking them into a term-query matrix
+    """
+
+    def __init__(self, corpus: list, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.vocab = {} # term -> column
+        rows, cols, tfs = [], [], []
+        doc_len = np.zeros(len(corpus))
+        for d, document in enumerate(corpus):
+            doc_len[d] = len(document)
+            frequencies = {}
+            for word in document:
+                frequencies[word] = frequencies.get(word, 0) + 1
+            for word, tf in frequencies.items():
+                rows.append(d)
+                cols.append(self.vocab.setdefault(word, len(self.vocab)))
+                tfs.append(tf)
+
+        self.corpus_size = len(corpus)
+        self.avgdl = doc_len.sum() / self.corpus_size
+        rows, cols, tfs = np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(tfs, dtype=np.float64)
+
+        # idf with floor eps * average idf for terms in more than half of the documents
+        nd = np.bincount(cols, minlength=len(self.vocab)).astype(np.float64)
+        idf = np.array([math.log(self.corpus_size - n + 0.5) - math.log(n + 0.5) for n in nd])
+        if len(idf):
+            idf[idf < 0] = self.epsilon * (idf.sum() / len(idf))
+        self.idf = idf
+
+        # precomputed per (document, term) contribution
+        norm = k1 * (1 - b + b * doc_len / self.avgdl)
+        weights = idf[cols] * (tfs * (k1 + 1) / (tfs + norm[rows]))
+        self.weights = csr_matrix((weights, (rows, cols)), shape=(self.corpus_size, len(self.vocab)))
+
+    # sparse term-query count matrix (repeated query terms count repeatedly)
+    def _query_matrix(self, queries: list) -> csr_matrix:
+        rows, cols = [], []
+        for j, query in enumerate(queries):
+            for q in query:
+                i = self.vocab.get(q)
+                if i is not None:
+                    rows.append(i)
+                    cols.append(j)
+        data = np.ones(len(rows))
+        return csr_matrix((data, (rows, cols)), shape=(len(self.vocab), len(queries)))
+
+    # scores of all documents for one tokenized query
+    def get_scores(self, query: list) -> np.ndarray:
+        return self.get_batch_scores([query])[:, 0]
+
+    # documents x queries score matrix
+    def get_batch_scores(self, queries: list) -> np.ndarray:
+        return (self.weights @ self._query_matrix(queries)).toarray()
\ No newline at end of file
@@ -1,3 +1,7 @@
+import os
+import json
+import sqlite3
+import hashlib
 import numpy as np
 from numpy.linalg import norm
 
@@ -6,10 +10,232 @@ def embed_word(word: str, embedding_model):
     return embedding_model.get_word_vector(word)
 
 
-def embed_words(words: list[str]) -> np.ndarray:
-    return np.stack([embed_word(w) for w in words])
+def embed_words(words: list[str], embedding_model) -> np.ndarray:
+    return np.stack([embed_word(w, embedding_model) for w in words])
 
 
 def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     return float(np.dot(a, b) / (norm(a) * norm(b) + 1e-8))
 
+
+# scale rows (or a single vector) to unit length
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = norm(vectors, axis=-1, keepdims=True)
+    return vectors / (norms + 1e-8)
+
+
+class VocabMatrix:
+
+    """
+    Embeds a word vocabulary once into a row-normalized matrix
+    Cosine similarities against any set of vectors become one matrix product
+    """
+
+    def __init__(self, words, embedding_model):
+        # sorted for a deterministic row order (vocab is usually a set)
+        self.words = [w for w in sorted(words) if w in embedding_model]
+        self.index = {w: i for i, w in enumerate(self.words)}
+
+        if self.words:
+            vectors = embed_words(self.words, embedding_model)
+        else:
+            vectors = np.zeros((0, embedding_model.get_dimension()), dtype=np.float32)
+        self.vectors = normalize_rows(vectors.astype(np.float32))
+
+    # write matrix + word list, e.g. to share it with worker processes
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.save(f"{path}.npy", np.asarray(self.vectors))
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump(self.words, f)
+
+    # memory-mapped (read-only) matrix written by `save`
+    @classmethod
+    def load(cls, path: str) -> "VocabMatrix":
+        vm = cls.__new__(cls)
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            vm.words = json.load(f)
+        vm.index = {w: i for i, w in enumerate(vm.words)}
+        vm.vectors = np.load(f"{path}.npy", mmap_mode="r")
+        return vm
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    # boolean row mask for the given words
+    def mask(self, words) -> np.ndarray:
+        m = np.zeros(len(self.words), dtype=bool)
+        for w in words:
+            i = self.index.get(w)
+            if i is not None:
+                m[i] = True
+        return m
+
+    # cosine similarity of every vocab word to each row of `targets`
+    def similarities(self, targets: np.ndarray) -> np.ndarray:
+        targets = normalize_rows(np.atleast_2d(targets).astype(np.float64))
+        out = np.empty((len(self.words), len(targets)))
+        for start, block in self._blocks():
+            out[start:start + len(block)] = block @ targets.T
+        return out
+
+    # max cosine similarity of every vocab word per group of `targets` rows
+    # (groups are consecutive rows starting at `offsets`)
+    def max_similarities(self, targets: np.ndarray, offsets) -> np.ndarray:
+        targets = normalize_rows(np.atleast_2d(targets).astype(np.float64))
+        out = np.empty((len(self.words), len(offsets)))
+        for start, block in self._blocks():
+            out[start:start + len(block)] = np.maximum.reduceat(block @ targets.T, offsets, axis=1)
+        return out
+
+    # fixed-size float64 row blocks (bounded memory, scores independent of batch width)
+    def _blocks(self, block_size: int = 2048):
+        for start in range(0, len(self.words), block_size):
+            yield start, self.vectors[start:start + block_size].astype(np.float64)
+
+
+class EmbeddingStore:
+
+    """
+    Memory-mapped subset of a fastText model (vectors + word index on disk)
+    Mirrors the `in` / `get_word_vector` interface of a fastText model
+    The full model is only loaded for words outside the store (subword vectors)
+    """
+
+    def __init__(self, path: str, model_path: str = "cc.en.300.bin"):
+        self.path = path
+        self.model_path = model_path
+        self._model = None
+
+        self.vectors = np.load(f"{path}.npy", mmap_mode="r")
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.words = meta["words"]
+        self.index = {w: i for i, w in enumerate(self.words)}
+        self.missing = set(meta["missing"]) # looked up at build time, not in model vocab
+
+    # extract vectors of `words` from the fastText model into a store at `path`
+    @classmethod
+    def build(cls, words, path: str, model_path: str = "cc.en.300.bin", model=None):
+        if model is None:
+            import fasttext
+            model = fasttext.load_model(model_path)
+
+        words = sorted(set(words))
+        stored = [w for w in words if w in model]
+        missing = [w for w in words if w not in model]
+
+        if stored:
+            vectors = embed_words(stored, model).astype(np.float32)
+        else:
+            vectors = np.zeros((0, model.get_dimension()), dtype=np.float32)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.save(f"{path}.npy", vectors)
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump({"model": model_path, "words": stored, "missing": missing}, f)
+
+        store = cls(path, model_path=model_path)
+        store._model = model # already loaded, keep for fallbacks
+        return store
+
+    # reuse the store at `path` if it knows all `words`, else (re)build it
+    @classmethod
+    def open_or_build(cls, words, path: str, model_path: str = "cc.en.300.bin"):
+        if os.path.exists(f"{path}.npy") and os.path.exists(f"{path}.json"):
+            store = cls(path, model_path=model_path)
+            if store.covers(words):
+                return store
+        return cls.build(words, path, model_path=model_path)
+
+    def covers(self, words) -> bool:
+        return all(w in self.index or w in self.missing for w in words)
+
+    # full fastText model, loaded on first out-of-store lookup
+    @property
+    def model(self):
+        if self._model is None:
+            import fasttext
+            self._model = fasttext.load_model(self.model_path)
+        return self._model
+
+    def get_dimension(self) -> int:
+        return self.vectors.shape[1]
+
+    def __contains__(self, word):
+        if word in self.index:
+            return True
+        if word in self.missing:
+            return False
+        return word in self.model
+
+    def get_word_vector(self, word):
+        i = self.index.get(word)
+        if i is not None:
+            return np.asarray(self.vectors[i])
+        return self.model.get_word_vector(word)
+
+
+
+class TextEmbeddingCache:
+
+    """
+    Persistent cache of sentence embeddings in a SQLite file
+    Keyed by a hash of model name + text, so identical texts are embedded once across runs
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL);")
+        self.conn.commit()
+
+    @staticmethod
+    def key(text: str, model_name: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    # cached vectors of the given keys (missing keys are left out)
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        keys = list(set(keys))
+        for start in range(0, len(keys), 500): # stay below the sqlite variable limit
+            chunk = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' for _ in chunk)});", chunk
+            )
+            for k, blob in rows:
+                found[k] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: dict) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?);",
+            [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()]
+        )
+        self.conn.commit()
+
+    # embeddings of all texts, only texts not seen before are encoded (in one batch)
+    # (model_name has to identify the model and its encode settings, e.g. normalization)
+    def encode(self, texts: list, model, model_name: str, **encode_kwargs) -> np.ndarray:
+        keys = [self.key(t, model_name) for t in texts]
+        found = self.get_many(keys)
+
+        missing = {}
+        for k, t in zip(keys, texts):
+            if k not in found:
+                missing.setdefault(k, t)
+        if missing:
+            vectors = model.encode(list(missing.values()), **encode_kwargs)
+            new = dict(zip(missing.keys(), np.asarray(vectors, dtype=np.float32)))
+            self.put_many(new)
+            found.update(new)
+
+        if not texts:
+            return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.stack([found[k] for k in keys])
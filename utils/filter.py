@@ -1,4 +1,5 @@
 import re
+import numpy as np
 
 # tokenizer (lowercase and snake/camel-case)
 def normalize(text: str):
@@ -7,6 +8,24 @@ def normalize(text: str):
     text = text.replace("_", " ")
     return text.split()
 
+# bm25 document of a schema table
+def table_to_document(table_name: str, table_def: dict):
+    return normalize(table_to_text(table_name, table_def))
+
+# indices of the k highest scores, best first (ties keep the original order, like a stable sort)
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    scores = np.asarray(scores)
+    n = len(scores)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    # every score >= the k-th largest is a candidate, sort only those
+    kth = np.partition(scores, n - k)[n - k]
+    candidates = np.flatnonzero(scores >= kth)
+    return candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+
 # convert schema table to text
 def table_to_text(table_name: str, table_def: dict):
     parts = [f"table {table_name}"]
@@ -1,3 +1,9 @@
+import json
+import hashlib
+from collections import ChainMap
+from collections.abc import Mapping
+from types import MappingProxyType
+
 #
 # base on schema json representation
 #
@@ -31,6 +37,38 @@ def get_original_column_names(schema_original: dict) -> set:
             cols.add(c["name"])
     return cols
 
+# content hash of a schema (table order included)
+def schema_hash(schema: dict) -> str:
+    data = json.dumps(schema, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+# scaled schema object holding only the synthetic tables + a reference to the original
+def make_schema_delta(schema_json: dict, schema_original: dict, base_dataset: str) -> dict:
+    return {
+        "dataset": schema_json["dataset"],
+        "db_id": schema_json["db_id"],
+        "base": {"dataset": base_dataset, "schema_hash": schema_hash(schema_original)},
+        "synthetic": {
+            t: obj for t, obj in schema_json["schema"].items()
+            if t not in schema_original
+        },
+    }
+
+def is_schema_delta(schema_json: dict) -> bool:
+    return "synthetic" in schema_json and "base" in schema_json
+
+# full schema object of a delta as a view (original tables first, nothing copied)
+def resolve_schema_delta(delta: dict, schema_original: dict) -> dict:
+    if schema_hash(schema_original) != delta["base"]["schema_hash"]:
+        raise ValueError(f"Original schema of {delta['db_id']} changed since the delta was written.")
+
+    return {
+        "dataset": delta["dataset"],
+        "db_id": delta["db_id"],
+        "schema": ChainMap(delta["synthetic"], schema_original),
+        "synthetic_tables": list(delta["synthetic"].keys()),
+    }
+
 # column based on input attributes
 def make_column(name: str, sql_type: str, pk: int = 0, notnull: bool = False) -> dict:
     t, tg = normalize_type(sql_type)
@@ -75,4 +113,84 @@ def sqlite_create_table_sql(table:str, obj:dict) -> str:
             )
 
         cols_sql = ",\n  ".join(col_lines)
-        return f'CREATE TABLE "{table}" (\n  {cols_sql}\n);'
\ No newline at end of file
+        return f'CREATE TABLE "{table}" (\n  {cols_sql}\n);'
+
+
+# read-only wrapper of a json value (dicts as mapping proxies, lists as tuples)
+def freeze(value):
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+# plain json value of a frozen value or view
+def thaw(value):
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+class TableView(Mapping):
+
+    """
+    Read-only view of a table object restricted to a table selection
+    Foreign keys to tables outside the selection are hidden, values are frozen on first access
+    """
+
+    def __init__(self, table_object: dict, selected: set):
+        self._table = table_object
+        self._selected = selected
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            if key == "foreign_keys":
+                self._values[key] = tuple(
+                    freeze(fk) for fk in self._table.get("foreign_keys", [])
+                    if fk["sourceTable"] in self._selected
+                )
+            else:
+                self._values[key] = freeze(self._table[key])
+        return self._values[key]
+
+    def __iter__(self):
+        keys = list(self._table)
+        if "foreign_keys" not in self._table:
+            keys.append("foreign_keys")
+        return iter(keys)
+
+    def __len__(self):
+        return len(self._table) + ("foreign_keys" not in self._table)
+
+
+class SchemaView(Mapping):
+
+    """
+    Read-only schema object holding only the selected tables of a shared schema object
+    Replaces deep copies of large schemas when filtering per question
+    """
+
+    def __init__(self, schema_object: Mapping, tables: list):
+        self._object = schema_object
+        selected = set(tables)
+        self._schema = MappingProxyType(
+            {t: TableView(schema_object["schema"][t], selected) for t in tables}
+        )
+
+    def __getitem__(self, key):
+        if key == "schema":
+            return self._schema
+        return freeze(self._object[key])
+
+    def __iter__(self):
+        return iter(self._object)
+
+    def __len__(self):
+        return len(self._object)
+
+    # plain (json serializable) copy of the view
+    def to_dict(self) -> dict:
+        return thaw(self)
\ No newline at end of file
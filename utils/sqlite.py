@@ -0,0 +1,90 @@
+import os
+import shutil
+import hashlib
+import sqlite3
+from urllib.request import pathname2url
+
+#
+# overlay variants: scaled sqlite files that only hold the synthetic tables
+# and are opened with the original database attached
+#
+
+OVERLAY_APPLICATION_ID = 0x53534D4F # marks overlay files (PRAGMA application_id)
+OVERLAY_SCHEMA = "original" # name the original database is attached under
+
+# (opened read-only, a missing file raises instead of being created empty)
+def is_overlay(db_path: str) -> bool:
+    conn = sqlite3.connect(f"file:{pathname2url(db_path)}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA application_id;").fetchone()[0] == OVERLAY_APPLICATION_ID
+    finally:
+        conn.close()
+
+def mark_overlay(conn: sqlite3.Connection) -> None:
+    conn.execute(f"PRAGMA application_id = {OVERLAY_APPLICATION_ID};")
+
+# open a database, attaching the original if it is an overlay
+# (unqualified table names resolve across main and the attached original)
+def connect(db_path: str, original_path: str = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    if original_path and is_overlay(db_path):
+        conn.execute(f"ATTACH DATABASE ? AS {OVERLAY_SCHEMA};", (original_path,))
+    return conn
+
+# mtime, size and content hash of a database file
+# (the hash of `previous` is reused if mtime and size did not change)
+def file_stamp(path: str, previous: dict = None) -> dict:
+    st = os.stat(path)
+    stamp = {"mtime": st.st_mtime, "size": st.st_size}
+    if previous and previous.get("mtime") == stamp["mtime"] and previous.get("size") == stamp["size"]:
+        stamp["sha256"] = previous.get("sha256")
+        return stamp
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    stamp["sha256"] = h.hexdigest()
+    return stamp
+
+# same file content as recorded in `stamp` (mtime + size first, hash only if they differ)
+def matches_stamp(path: str, stamp: dict) -> bool:
+    if not stamp or not os.path.exists(path):
+        return False
+    st = os.stat(path)
+    if stamp.get("mtime") == st.st_mtime and stamp.get("size") == st.st_size:
+        return True
+    if stamp.get("size") != st.st_size:
+        return False
+    return file_stamp(path)["sha256"] == stamp.get("sha256")
+
+# write a standalone copy of an overlay (original + synthetic tables) to out_path,
+# for tools that open databases by path themselves
+def materialize_overlay(db_path: str, original_path: str, out_path: str) -> str:
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    shutil.copy2(original_path, out_path)
+
+    conn = sqlite3.connect(out_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS overlay;", (db_path,))
+        objects = conn.execute(
+            """ SELECT type, name, sql
+                FROM overlay.sqlite_master
+                WHERE type IN ('table', 'index')
+                AND name NOT LIKE 'sqlite_%'
+                AND sql IS NOT NULL
+                ORDER BY type = 'index', rowid;
+            """
+        ).fetchall()
+
+        conn.execute("BEGIN;")
+        for obj_type, name, sql in objects:
+            conn.execute(sql)
+            if obj_type == "table":
+                conn.execute(f'INSERT INTO main."{name}" SELECT * FROM overlay."{name}";')
+        conn.execute("COMMIT;")
+        conn.execute("DETACH DATABASE overlay;")
+    finally:
+        conn.close()
+
+    return out_path
@@ -0,0 +1,13 @@
+from functools import lru_cache
+
+DEFAULT_ENCODING = "o200k_base" # tokenizer of the gpt-4o / gpt-5 family
+
+# tiktoken encoding, loaded once per process
+@lru_cache(maxsize=None)
+def get_encoding(name: str = DEFAULT_ENCODING):
+    import tiktoken
+    return tiktoken.get_encoding(name)
+
+# number of prompt tokens of a text
+def count_tokens(text: str, encoding: str = DEFAULT_ENCODING) -> int:
+    return len(get_encoding(encoding).encode(text, disallowed_special=()))
\ No newline at end of file
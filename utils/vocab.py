@@ -1,6 +1,14 @@
+import os
+import json
+import hashlib
 from nltk.corpus import wordnet as wn
 from wordfreq import zipf_frequency
 
+from configs.paths import VOCAB_PATH
+
+# bump when the selection logic below changes (invalidates cached vocabularies)
+VOCAB_VERSION = 1
+
 EXCLUDED_LEXNAMES = {
     "noun.person",
     "noun.location",
@@ -167,34 +175,81 @@ COMMON_NOUN_WHITELIST  = [
     "zone"
 ]
 
-# load clean noun vocab
-def load_noun_vocabulary(min_len=4):
-    nouns = set()
+# load clean noun vocab (cached per selection parameters)
+def load_noun_vocabulary(min_len=4, use_cache=True):
+    cache_path = f"{VOCAB_PATH}nouns_{vocabulary_fingerprint(min_len)}.json"
+
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return set(json.load(f)["nouns"])
+
+    nouns = build_noun_vocabulary(min_len=min_len)
+
+    if use_cache:
+        os.makedirs(VOCAB_PATH, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": VOCAB_VERSION,
+                "min_len": min_len,
+                "nouns": sorted(nouns),
+            }, f)
+
+    return nouns
+
+# hash of everything that determines the vocabulary
+def vocabulary_fingerprint(min_len=4) -> str:
+    key = json.dumps({
+        "version": VOCAB_VERSION,
+        "min_len": min_len,
+        "whitelist": sorted(COMMON_NOUN_WHITELIST),
+        "excluded": sorted(EXCLUDED_LEXNAMES),
+    }, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+# single pass over wordnet, every lemma is evaluated once
+def build_noun_vocabulary(min_len=4):
+
+    # lemma -> lexnames of all its noun senses
+    lexnames = {}
+    # lemmas of non-excluded synsets that pass the surface filters
+    lemmas = set()
+
     for syn in wn.all_synsets(pos=wn.NOUN):
-        
-        if syn.lexname() in EXCLUDED_LEXNAMES:
-            continue
-        
+        lexname = syn.lexname()
+
         for lemma in syn.lemma_names():
-            
+
             lemma = lemma.lower()
+            lexnames.setdefault(lemma, set()).add(lexname)
 
+            if lexname in EXCLUDED_LEXNAMES:
+                continue
             if not lemma.isalpha():
                 continue
             if "_" in lemma:
                 continue
             if len(lemma) < min_len:
                 continue
-            if has_excluded_sense(lemma):
-                continue
-            
-            z = zipf_frequency(lemma, "en")
 
-            # use zipfto get proper and common nouns
-            if z > 4.0 and lemma not in COMMON_NOUN_WHITELIST:
-                continue
+            lemmas.add(lemma)
+
+    nouns = set()
+    for lemma in lemmas:
+
+        # same senses as wn.synsets(lemma) (base forms via morphy included)
+        senses = set()
+        for form in wn._morphy(lemma, wn.NOUN):
+            senses |= lexnames.get(form, set())
+        if senses & EXCLUDED_LEXNAMES:
+            continue
+
+        z = zipf_frequency(lemma, "en")
+
+        # use zipfto get proper and common nouns
+        if z > 4.0 and lemma not in COMMON_NOUN_WHITELIST:
+            continue
 
-            nouns.add(lemma)
+        nouns.add(lemma)
 
     return nouns
 